@@ -74,39 +74,73 @@ export default function Chatbot() {
     setLoading(true);
 
     try {
-      const aiRes = await fetch('https://lock-in-sable.vercel.app/api/ai', {
+      // One NDJSON stream carries text deltas and per-sentence audio frames
+      const res = await fetch('https://lock-in-sable.vercel.app/api/ai-speech', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ message: input }),
       });
-      if (!aiRes.ok) throw new Error(`AI request failed: ${aiRes.status}`);
+      if (!res.ok || !res.body) throw new Error(`AI request failed: ${res.status}`);
 
-      const aiData = await aiRes.json();
-      const aiText = aiData.response;
-
-      // Request both TTS and text together (concurrently)
-      const ttsPromise = fetch('https://lock-in-sable.vercel.app/api/tts', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: aiText }),
-      });
-
-      const ttsRes = await ttsPromise;
-      if (!ttsRes.ok) throw new Error('TTS fetch failed');
-
-      const audioBlob = await ttsRes.blob();
-      const audioUrl = URL.createObjectURL(audioBlob);
+      // Play sentences back to back as they arrive
+      const audioQueue: string[] = [];
+      let playing = false;
+      const playNext = () => {
+        const audioUrl = audioQueue.shift();
+        if (!audioUrl) {
+          playing = false;
+          return;
+        }
+        playing = true;
+        const audio = new Audio(audioUrl);
+        audio.onended = () => {
+          URL.revokeObjectURL(audioUrl);
+          playNext();
+        };
+        audio.play();
+      };
 
-      // Both text + audio are now ready: stop thinking, show message, then play
-      setLoading(false);
-      const aiMessage: Message = { sender: 'ai', text: aiText };
-      setMessages((prev) => [...prev, aiMessage]);
+      let aiText = '';
+      let started = false;
+      const showText = () => {
+        const aiMessage: Message = { sender: 'ai', text: aiText };
+        if (!started) {
+          started = true;
+          setLoading(false);
+          setMessages((prev) => [...prev, aiMessage]);
+        } else {
+          setMessages((prev) => [...prev.slice(0, -1), aiMessage]);
+        }
+      };
 
-      const audio = new Audio(audioUrl);
-      audio.play();
-      audio.onended = () => {
-        URL.revokeObjectURL(audioUrl);
+      const handleEvent = (event: any) => {
+        if (event.type === 'text') {
+          aiText += event.delta;
+          showText();
+        } else if (event.type === 'audio') {
+          const bytes = Uint8Array.from(atob(event.data), (c) => c.charCodeAt(0));
+          audioQueue.push(URL.createObjectURL(new Blob([bytes], { type: 'audio/mpeg' })));
+          if (!playing) playNext();
+        } else if (event.type === 'error') {
+          throw new Error(event.error);
+        }
       };
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop() || '';
+        for (const line of lines) {
+          if (line.trim()) handleEvent(JSON.parse(line));
+        }
+      }
+      if (buffered.trim()) handleEvent(JSON.parse(buffered));
+      if (!started) showText();
     } catch (error) {
       console.error('Message send failed:', error);
       const errorMessage: Message = {
@@ -134,14 +134,6 @@ export default function ProfileDashboard() {
     }
   };
 
-  function getDatePositionInArray(dateString: string, today: Date = new Date()): number {
-    const [year, month, day] = dateString.split('-').map(Number);
-    const targetDate = new Date(Date.UTC(year, month - 1, day));
-    const todayUTC = new Date(Date.UTC(today.getFullYear(), today.getMonth(), today.getDate()));
-    const diffTime = targetDate.getTime() - todayUTC.getTime();
-    return 364 + Math.floor(diffTime / (1000 * 60 * 60 * 24));
-  }
-
   const generateHeatmapData = async () => {
     try {
       const today = new Date();
@@ -149,30 +141,20 @@ export default function ProfileDashboard() {
       const m = (today.getMonth() + 1).toString().padStart(2, '0');
       const d = today.getDate().toString().padStart(2, '0');
       const todayIso = `${y}-${m}-${d}`;
-      const lastYearIso = `${y - 1}-${m}-${d}`;
 
-      const response = await fetch('https://lock-in-sable.vercel.app/api/get-sessions-from-date/' + user.userId + '/' + lastYearIso + '/' + todayIso);
+      // One pre-bucketed entry per day for the last 365 days (oldest first)
+      const response = await fetch('https://lock-in-sable.vercel.app/api/activity/' + user.userId + '?end_date=' + todayIso);
       if (!response.ok) return { heatmapData: [], sessionsData: [] };
       const result = await response.json();
-      const sessions = result.data.sessions || [];
-
-      setSessionsData(sessions);
-
-      const activity = new Array(365).fill(0);
-      for (let i = 0; i < sessions.length; i++) {
-        activity[getDatePositionInArray(sessions[i].date)] += sessions[i].total_hours;
-      }
-
-      const hm = new Array(365);
-      for (let i = 364; i >= 0; i--) {
-        const date = new Date(today);
-        date.setDate(date.getDate() - i);
-        hm[364 - i] = {
-          date: date.toISOString().split('T')[0],
-          count: activity[364 - i]
-        };
-      }
-      return { heatmapData: hm, sessionsData: sessions };
+      const days = result.data.activity || [];
+
+      setSessionsData(days);
+
+      const hm = days.map((day: any) => ({
+        date: day.date,
+        count: day.total_hours
+      }));
+      return { heatmapData: hm, sessionsData: days };
     } catch (e) {
       console.error('Error fetching heatmap data', e);
       return { heatmapData: [], sessionsData: [] };
@@ -0,0 +1,261 @@
+"""
+Admission control for the endpoints that call Gemini/ElevenLabs.
+
+- Token buckets per user and per client IP, kept in process memory or in a
+  Mongo collection shared by every worker (RATE_LIMIT_BACKEND).
+- A cap on upstream calls in flight in this process (UPSTREAM_MAX_CONCURRENCY).
+- Single-flight coalescing: concurrent calls with the same key share one
+  upstream result, within a process or across processes through Mongo
+  (SINGLE_FLIGHT_BACKEND).
+
+Anything over a limit raises Rejected right away instead of queueing.
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from database import get_collection
+
+
+class Rejected(Exception):
+    """Over a rate or concurrency limit; retry after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class MemoryTokenBuckets:
+    """`rate` tokens per second up to `burst`, one bucket per key, in this process."""
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Take one token; returns 0 if allowed, else the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed = True
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed = False
+            if len(self._buckets) > self.max_keys:
+                # Full buckets carry no state worth keeping
+                self._buckets = {k: v for k, v in self._buckets.items() if v[0] + (now - v[1]) * self.rate < self.burst}
+        return 0 if allowed else (1 - tokens) / self.rate
+
+
+class MongoTokenBuckets:
+    """Token buckets shared between workers, updated with compare-and-set on `updated_at`."""
+
+    def __init__(self, collection_name, rate, burst, attempts=5):
+        self.collection = get_collection(collection_name)
+        self.rate = rate
+        self.burst = burst
+        self.attempts = attempts
+
+    def ensure_indexes(self):
+        # Idle buckets are full again after burst / rate seconds, so they can go
+        self.collection.create_index([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0)
+
+    def take(self, key):
+        for _ in range(self.attempts):
+            now = datetime.utcnow()
+            bucket = self.collection.find_one({'_id': key})
+            if bucket is None:
+                tokens, match = self.burst, None
+            else:
+                elapsed = (now - bucket['updated_at']).total_seconds()
+                tokens, match = min(self.burst, bucket['tokens'] + elapsed * self.rate), bucket['updated_at']
+
+            allowed = tokens >= 1
+            update = {
+                'tokens': tokens - 1 if allowed else tokens,
+                'updated_at': now,
+                'expires_at': now + timedelta(seconds=self.burst / self.rate)
+            }
+            try:
+                if match is None:
+                    self.collection.insert_one({'_id': key, **update})
+                elif self.collection.update_one({'_id': key, 'updated_at': match}, {'$set': update}).modified_count == 0:
+                    continue
+            except DuplicateKeyError:
+                continue
+            return 0 if allowed else (1 - tokens) / self.rate
+        # Heavy contention on one key is itself a sign to back off
+        return 1 / self.rate
+
+
+def make_token_buckets(backend, collection_name, per_minute, burst):
+    """Build token buckets for the configured backend ('memory', 'mongo' or 'none')."""
+    if backend == 'none' or per_minute <= 0:
+        return None
+    if backend == 'mongo':
+        return MongoTokenBuckets(collection_name, rate=per_minute / 60, burst=burst)
+    return MemoryTokenBuckets(rate=per_minute / 60, burst=burst)
+
+
+class ConcurrencyLimit:
+    """Non-blocking cap on work in flight; `with limit:` raises Rejected when full."""
+
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Rejected("Too many upstream requests in progress")
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stats(self):
+        return {'in_flight': self.in_flight, 'rejected': self.rejected}
+
+
+class SingleFlight:
+    """Concurrent do(key, fn) calls in this process run fn once and share its result or exception."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                # Same answer as MongoSingleFlight, so both backends give a 429
+                raise Rejected("Timed out waiting for an identical request", retry_after=1)
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return future.result()
+
+
+class MongoSingleFlight(SingleFlight):
+    """SingleFlight across processes: the leader holds a lease document and publishes the result in it.
+
+    Followers in other processes poll that document. If the leader fails or its
+    lease runs out, they run fn themselves. Results must be BSON-encodable (str/bytes).
+    """
+
+    def __init__(self, collection_name, lease_seconds=30, poll_interval=0.05):
+        super().__init__()
+        self.collection = get_collection(collection_name)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def ensure_indexes(self):
+        self.collection.create_index([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0)
+
+    def do(self, key, fn, timeout=None):
+        return super().do(key, lambda: self._do_shared(key, fn, timeout), timeout)
+
+    def _do_shared(self, key, fn, timeout):
+        deadline = time.monotonic() + (timeout or self.lease_seconds)
+        while True:
+            now = datetime.utcnow()
+            try:
+                self.collection.insert_one({'_id': key, 'done': False, 'expires_at': now + timedelta(seconds=self.lease_seconds)})
+                break
+            except DuplicateKeyError:
+                pass
+            flight = self.collection.find_one({'_id': key})
+            if flight is None or flight['expires_at'] < now:
+                # Leader gone; clear its lease and compete for a new one
+                self.collection.delete_one({'_id': key, 'done': False, 'expires_at': {'$lt': now}})
+                continue
+            if flight['done']:
+                with self._lock:
+                    self.coalesced += 1
+                return flight['result']
+            if time.monotonic() > deadline:
+                raise Rejected("Timed out waiting for an identical request", retry_after=1)
+            time.sleep(self.poll_interval)
+
+        try:
+            result = fn()
+        except BaseException:
+            self.collection.delete_one({'_id': key})
+            raise
+        # Keep the published result around briefly for followers still polling
+        self.collection.update_one(
+            {'_id': key},
+            {'$set': {'done': True, 'result': result, 'expires_at': datetime.utcnow() + timedelta(seconds=5)}}
+        )
+        return result
+
+
+def make_single_flight(backend, collection_name, lease_seconds):
+    if backend == 'mongo':
+        return MongoSingleFlight(collection_name, lease_seconds=lease_seconds)
+    return SingleFlight()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop (the ASGI entry point)."""
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key, make_coroutine):
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await make_coroutine()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved so a leader-only failure isn't reported as never awaited
+            future.exception()
+            raise
+        finally:
+            self._calls.pop(key, None)
@@ -1,112 +1,460 @@
-from flask import Flask, request, jsonify, send_file
-from google import genai
+from flask import Flask, Response, request, jsonify, send_file, url_for
 from flask_cors import CORS
 from models.User import User
 from models.AuthToken import AuthToken
-from models.Session import Session
+from auth import authenticate, request_token, verify_token_cached
+from admission import Rejected, ConcurrencyLimit, make_token_buckets, make_single_flight
+from password_pool import PasswordPoolBusy, password_pool
+import metrics
+from metrics import time_upstream
+from upstream import get_gemini_client, get_elevenlabs_client
+from models.Session import Session, SESSION_FIELDS, sessions_collection
+from models.SessionBucket import SessionBucket
 from utils import validate_email, validate_password, validate_username, create_response
 from bson import ObjectId
-import json
 from config import Config
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, OperationFailure
+from database import get_client, get_db
+from json_provider import FastJSONProvider
+from cache import make_cache, normalize_prompt, hash_key, DiskCache
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, OperationFailure, DuplicateKeyError
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime
 from models.Record import Record
-import bcrypt
-import os
-from dotenv import load_dotenv 
-import json 
-import sys
-from elevenlabs.client import ElevenLabs
-from elevenlabs.play import play
+from models.DailyActivity import DailyActivity
+from models.DataVersion import DataVersion
+from http_cache import conditional
+from session_queue import session_queue, write_sessions
+from leaderboard import leaderboard, LeaderboardWarming, METRICS
+from export import EXPORT_FORMATS, FILE_FORMATS, export_rows, chunks, write_file
+import click
+import time
 import io
-
-gemini_api=os.getenv('GEMINI_KEY')
-client=genai.Client(api_key=gemini_api)
-
-class JSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        return super(JSONEncoder, self).default(obj)
+import re
+import base64
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
-app.json_encoder = JSONEncoder
+app.json = FastJSONProvider(app)
 CORS(app)
+metrics.init_app(app)
+
+AI_MODEL = "gemini-2.5-flash"
+AI_PROMPT = "Answer the following question, but don't include any special characters (*) in your response. If asked about your name, say My name is Ashley and I am your virtual Study Buddy!. Here is my question: {message}."
+
+ai_cache = make_cache(
+    Config.AI_CACHE_BACKEND,
+    'ai_cache',
+    max_entries=Config.AI_CACHE_MAX_ENTRIES,
+    ttl=Config.AI_CACHE_TTL_SECONDS
+)
+
+user_buckets = make_token_buckets(
+    Config.RATE_LIMIT_BACKEND,
+    'rate_limits',
+    per_minute=Config.RATE_LIMIT_USER_PER_MINUTE,
+    burst=Config.RATE_LIMIT_USER_BURST
+)
+ip_buckets = make_token_buckets(
+    Config.RATE_LIMIT_BACKEND,
+    'rate_limits',
+    per_minute=Config.RATE_LIMIT_IP_PER_MINUTE,
+    burst=Config.RATE_LIMIT_IP_BURST
+)
+upstream_slots = ConcurrencyLimit(Config.UPSTREAM_MAX_CONCURRENCY)
+single_flight = make_single_flight(Config.SINGLE_FLIGHT_BACKEND, 'single_flight', Config.SINGLE_FLIGHT_TIMEOUT_SECONDS)
+
+
+def admit_upstream(ip, user_id=None):
+    """Charge one upstream-bound request to its IP and user buckets; raises Rejected if either is empty."""
+    for buckets, key in ((ip_buckets, ip and f'ip:{ip}'), (user_buckets, user_id and f'user:{user_id}')):
+        if buckets is None or not key:
+            continue
+        wait = buckets.take(key)
+        if wait:
+            raise Rejected("Too many requests, please slow down", retry_after=wait)
+
+
+def client_ip(forwarded_for, remote_addr):
+    """The address rate limits are charged to; shared by the WSGI and ASGI handlers."""
+    if Config.TRUST_PROXY_HEADERS and forwarded_for:
+        return forwarded_for.split(',')[0].strip()
+    return remote_addr
+
+
+def admit_request():
+    ip = client_ip(request.headers.get('X-Forwarded-For'), request.remote_addr)
+    token = request_token()
+    admit_upstream(ip, verify_token_cached(token) if token else None)
+
+
+def rejected_response(e):
+    return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
+
+
+def generate_answer(message, cache_key):
+    with upstream_slots, time_upstream('gemini', 'generate_content'):
+        response = get_gemini_client().models.generate_content(
+            model=AI_MODEL,
+            contents=AI_PROMPT.format(message=message)
+        )
+    if ai_cache is not None and response.text:
+        ai_cache.set(cache_key, response.text)
+    return response.text
+
 
 @app.post("/api/ai")
 def ai():
     data = request.get_json()
     message = data.get("message", "")
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=f"Answer the following question, but don't include any special characters (*) in your response. If asked about your name, say My name is Ashley and I am your virtual Study Buddy!. Here is my question: {message}."
-    )
+    cache_key = hash_key(AI_MODEL, normalize_prompt(message))
+    if ai_cache is not None:
+        cached = ai_cache.get(cache_key)
+        if cached is not None:
+            return jsonify({"response": cached})
 
-    return jsonify({"response": response.text})
+    try:
+        admit_request()
+        # Identical questions asked at the same time share one Gemini call
+        text = single_flight.do(cache_key, lambda: generate_answer(message, cache_key), timeout=Config.SINGLE_FLIGHT_TIMEOUT_SECONDS)
+    except Rejected as e:
+        return rejected_response(e)
+    return jsonify({"response": text})
+
+@app.get("/api/cache-stats")
+def cache_stats():
+    return create_response(True, "Cache stats retrieved successfully", {
+        'ai': ai_cache.stats() if ai_cache is not None else None,
+        'tts': tts_cache.stats() if tts_cache is not None else None
+    })
 
-# ElevenLabs Setup
-elevenlabs_api_key = os.environ.get("ELEVEN_LABS")
-elevenlabs_client = None
-if not elevenlabs_api_key:
+# ElevenLabs Setup (the client itself is built on first use, see upstream.py)
+if not Config.ELEVEN_LABS_API_KEY:
     print("Warning: ELEVEN_LABS environment variable not set.")
-else:
-    elevenlabs_client = ElevenLabs(api_key=elevenlabs_api_key)
+
+
+TTS_VOICE_ID = "bxiObU1YDrf7lrFAyV99"  # Example voice
+TTS_MODEL_ID = "eleven_multilingual_v2"
+TTS_OUTPUT_FORMAT = "mp3_44100_128"
+# Cached audio is content-addressed, so clients may keep it indefinitely
+TTS_AUDIO_MAX_AGE = 365 * 24 * 3600
+
+tts_cache = None
+if Config.TTS_CACHE_MAX_BYTES > 0:
+    tts_cache = DiskCache(Config.TTS_CACHE_DIR, max_bytes=Config.TTS_CACHE_MAX_BYTES, suffix=".mp3")
+
+
+
+def cache_metrics():
+    samples = []
+    for name, cache in (('ai', ai_cache), ('tts', tts_cache)):
+        if cache is None:
+            continue
+        stats = cache.stats()
+        for field in ('hits', 'misses', 'size'):
+            samples.append((f'lockin_cache_{field}', {'cache': name}, stats[field]))
+    return samples
+
+
+def password_pool_metrics():
+    return [(f'lockin_bcrypt_{field}', {}, value) for field, value in password_pool.stats().items()]
+
+
+def admission_metrics():
+    samples = [(f'lockin_upstream_{field}', {}, value) for field, value in upstream_slots.stats().items()]
+    samples.append(('lockin_upstream_coalesced', {}, single_flight.coalesced))
+    return samples
+
+
+metrics.register_collector(cache_metrics)
+metrics.register_collector(password_pool_metrics)
+metrics.register_collector(admission_metrics)
+
+if Config.SESSION_INGEST_MODE == 'queue':
+    metrics.register_collector(
+        lambda: [(f'lockin_session_queue_{field}', {}, value) for field, value in session_queue.stats().items()]
+    )
+
+
+def send_cached_audio(audio_key, path):
+    """Serve a cached MP3 from disk with a strong ETag so repeats can be answered with 304."""
+    response = send_file(
+        path,
+        mimetype="audio/mpeg",
+        as_attachment=False,
+        etag=audio_key,
+        conditional=True,
+        max_age=TTS_AUDIO_MAX_AGE
+    )
+    response.cache_control.immutable = True
+    response.headers["Content-Location"] = url_for("tts_audio", audio_key=audio_key)
+    return response
+
+
+def stream_tts_audio(audio_key, audio_stream):
+    """Forward ElevenLabs chunks to the client as they arrive (chunked transfer).
+
+    The first chunk is pulled before the response starts so upstream failures
+    can still be reported as a JSON error. Complete replies are added to the cache.
+    """
+    chunks = iter(audio_stream)
+    with time_upstream('elevenlabs', 'stream_first_chunk'):
+        first_chunk = next((chunk for chunk in chunks if chunk), None)
+    if first_chunk is None:
+        return jsonify({"error": "Failed to generate audio"}), 500
+
+    def generate():
+        received = [first_chunk]
+        total_bytes = len(first_chunk)
+        yield first_chunk
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                total_bytes += len(chunk)
+                if total_bytes > Config.TTS_STREAM_MAX_BYTES:
+                    print(f"TTS stream for {audio_key} exceeded {Config.TTS_STREAM_MAX_BYTES} bytes, truncating")
+                    return
+                received.append(chunk)
+                yield chunk
+        except Exception as e:
+            # Headers are already sent, so all we can do is end the stream early
+            print(f"Error streaming TTS audio: {e}")
+            return
+
+        if tts_cache is not None:
+            tts_cache.put(audio_key, b"".join(received))
+
+    return Response(generate(), mimetype="audio/mpeg", headers={"X-Audio-Key": audio_key})
 
 
 @app.post("/api/tts")
 def tts():
     """
     Receives text in a JSON payload and returns MP3 audio data.
+    With "stream": true (or ?stream=1) audio is forwarded while it is being synthesized.
     """
     data = request.get_json()
     message = data.get("message")
+    stream = bool(data.get("stream")) or request.args.get("stream") == "1"
 
     if not message:
         return jsonify({"error": "No message provided"}), 400
+
+    audio_key = hash_key(message, TTS_VOICE_ID, TTS_MODEL_ID, TTS_OUTPUT_FORMAT)
+    if tts_cache is not None:
+        cached_path = tts_cache.get_path(audio_key)
+        if cached_path:
+            return send_cached_audio(audio_key, cached_path)
     
-    # Check if the client was initialized
+    # Check if the client can be initialized
+    elevenlabs_client = get_elevenlabs_client()
     if not elevenlabs_client:
         return jsonify({"error": "Server is missing ElevenLabs API key"}), 500
 
     try:
-        # 1. Generate the audio stream from ElevenLabs using the v1 client
-        audio_stream = elevenlabs_client.text_to_speech.convert(
-            text=message,  # <-- Use the message from the client
-            voice_id="bxiObU1YDrf7lrFAyV99",  # Example voice
-            model_id="eleven_multilingual_v2",
-            output_format="mp3_44100_128",
-        )
+        admit_request()
+        if stream:
+            # The slot is held until the client has received the whole stream
+            upstream_slots.acquire()
+            try:
+                audio_stream = elevenlabs_client.text_to_speech.stream(
+                    text=message,
+                    voice_id=TTS_VOICE_ID,
+                    model_id=TTS_MODEL_ID,
+                    output_format=TTS_OUTPUT_FORMAT,
+                )
+                response = stream_tts_audio(audio_key, audio_stream)
+            except BaseException:
+                upstream_slots.release()
+                raise
+            if isinstance(response, Response):
+                response.call_on_close(upstream_slots.release)
+            else:
+                upstream_slots.release()
+            return response
 
-        # 2. Collect the audio data from the generator
-        audio_data_chunks = []
-        for chunk in audio_stream:
-            if chunk:
-                audio_data_chunks.append(chunk)
-        
-        if not audio_data_chunks:
+        def convert():
+            # Only the caller that goes upstream takes a slot, as in asgi.py; /api/ai-speech
+            # calls convert_speech without one because its stream already holds a slot
+            with upstream_slots:
+                return convert_speech(elevenlabs_client, message, audio_key)
+
+        # 1. Generate the audio with ElevenLabs, once for identical concurrent requests
+        audio_bytes = single_flight.do(audio_key, convert, timeout=Config.SINGLE_FLIGHT_TIMEOUT_SECONDS)
+        if not audio_bytes:
             return jsonify({"error": "Failed to generate audio"}), 500
 
-        audio_bytes = b"".join(audio_data_chunks)
+        # 2. Serve the file the cache now holds
+        cached_path = tts_cache.get_path(audio_key) if tts_cache is not None else None
+        if cached_path:
+            return send_cached_audio(audio_key, cached_path)
 
-        # 3. Create an in-memory file (a buffer)
+        # Without a cache, send an in-memory file (a buffer)
         audio_buffer = io.BytesIO(audio_bytes)
         audio_buffer.seek(0)  # Rewind buffer to the start
 
-        # 4. Send the audio file back to the client
         return send_file(
             audio_buffer,
             mimetype="audio/mpeg",  # Specify the content type is MP3
             as_attachment=False     # Tell the browser to play it, not download it
         )
 
+    except Rejected as e:
+        return rejected_response(e)
     except Exception as e:
         print(f"Error generating TTS audio: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.get("/api/tts/<audio_key>.mp3")
+def tts_audio(audio_key):
+    """Serves previously synthesized audio by its content key (GET, so browsers can cache it)."""
+    cached_path = None
+    if tts_cache is not None and re.fullmatch(r'[0-9a-f]{64}', audio_key):
+        cached_path = tts_cache.get_path(audio_key)
+    if not cached_path:
+        return jsonify({"error": "Audio not found"}), 404
+    return send_cached_audio(audio_key, cached_path)
+
+
+# Sentences are voiced in the background while Gemini keeps generating
+speech_executor = ThreadPoolExecutor(max_workers=4)
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sentences(text):
+    """Split off complete sentences; returns (sentences, unfinished remainder)."""
+    parts = SENTENCE_END.split(text)
+    return [part.strip() for part in parts[:-1] if part.strip()], parts[-1]
+
+
+def convert_speech(elevenlabs_client, text, audio_key):
+    """Synthesize `text` in one upstream call and add it to the TTS cache."""
+    with time_upstream('elevenlabs', 'convert'):
+        audio_stream = elevenlabs_client.text_to_speech.convert(
+            text=text,
+            voice_id=TTS_VOICE_ID,
+            model_id=TTS_MODEL_ID,
+            output_format=TTS_OUTPUT_FORMAT,
+        )
+        audio_bytes = b"".join(chunk for chunk in audio_stream if chunk)
+    if tts_cache is not None and audio_bytes:
+        tts_cache.put(audio_key, audio_bytes)
+    return audio_bytes
+
+
+def synthesize_speech(text):
+    """Return MP3 bytes for `text`, using the TTS cache when possible."""
+    audio_key = hash_key(text, TTS_VOICE_ID, TTS_MODEL_ID, TTS_OUTPUT_FORMAT)
+    if tts_cache is not None:
+        cached_path = tts_cache.get_path(audio_key)
+        if cached_path:
+            with open(cached_path, 'rb') as f:
+                return f.read()
+    # Runs inside an /api/ai-speech stream, which already holds an upstream slot
+    return single_flight.do(
+        audio_key,
+        lambda: convert_speech(get_elevenlabs_client(), text, audio_key),
+        timeout=Config.SINGLE_FLIGHT_TIMEOUT_SECONDS
+    )
+
+
+@app.post("/api/ai-speech")
+def ai_speech():
+    """
+    Answers a chat message and voices it in one NDJSON stream. Each line is one of
+    {"type": "text", "delta": ...}, {"type": "audio", "index": n, "data": <base64 mp3>},
+    {"type": "error", "error": ...} and finally {"type": "done", "response": <full text>}.
+    Speech for the first sentence starts while the rest is still being generated.
+    """
+    data = request.get_json()
+    message = data.get("message", "")
+
+    if not get_elevenlabs_client():
+        return jsonify({"error": "Server is missing ElevenLabs API key"}), 500
+
+    cache_key = hash_key(AI_MODEL, normalize_prompt(message))
+    cached = ai_cache.get(cache_key) if ai_cache is not None else None
+
+    try:
+        admit_request()
+        # Held for the whole stream, including the sentences voiced on speech_executor
+        upstream_slots.acquire()
+    except Rejected as e:
+        return rejected_response(e)
+
+    def text_chunks():
+        if cached is not None:
+            yield cached
+            return
+        with time_upstream('gemini', 'generate_content_stream'):
+            for chunk in get_gemini_client().models.generate_content_stream(
+                model=AI_MODEL,
+                contents=AI_PROMPT.format(message=message)
+            ):
+                if chunk.text:
+                    yield chunk.text
+
+    def event(payload):
+        return app.json.dumps(payload) + "\n"
+
+    def generate():
+        pending = deque()
+        full_text = []
+        remainder = ""
+        index = 0
+
+        def audio_event(future):
+            return event({"type": "audio", "index": index, "data": base64.b64encode(future.result()).decode("ascii")})
+
+        try:
+            for delta in text_chunks():
+                full_text.append(delta)
+                yield event({"type": "text", "delta": delta})
+
+                sentences, remainder = split_sentences(remainder + delta)
+                for sentence in sentences:
+                    pending.append(speech_executor.submit(synthesize_speech, sentence))
+                # Forward finished audio in order without waiting on later sentences
+                while pending and pending[0].done():
+                    yield audio_event(pending.popleft())
+                    index += 1
+
+            if remainder.strip():
+                pending.append(speech_executor.submit(synthesize_speech, remainder.strip()))
+            while pending:
+                yield audio_event(pending.popleft())
+                index += 1
+        except Exception as e:
+            print(f"Error streaming AI speech: {e}")
+            for future in pending:
+                future.cancel()
+            yield event({"type": "error", "error": str(e)})
+            return
+
+        response_text = "".join(full_text)
+        if ai_cache is not None and cached is None and response_text:
+            ai_cache.set(cache_key, response_text)
+        yield event({"type": "done", "response": response_text})
+
+    response = Response(generate(), mimetype="application/x-ndjson")
+    response.call_on_close(upstream_slots.release)
+    return response
+
+
+def password_pool_busy_response():
+    response, status_code = create_response(False, "Server is busy, please try again shortly", status_code=503)
+    response.headers['Retry-After'] = '1'
+    return response, status_code
+
+def leaderboard_warming_response():
+    response, status_code = create_response(False, "Leaderboard is loading, please try again shortly", status_code=503)
+    response.headers['Retry-After'] = '5'
+    return response, status_code
+
+
 @app.route('/api/signup', methods=['POST'])
 def signup():
     try:
@@ -142,7 +490,11 @@ def signup():
         # Create new user
         password_hash = User.hash_password(password)
         new_user = User(username=username, email=email, password_hash=password_hash)
-        new_user.save()
+        try:
+            new_user.save()
+        except DuplicateKeyError:
+            # Lost a race with a concurrent signup for the same email/username
+            return create_response(False, "User with this email or username already exists", status_code=409)
 
         # Create associated record
         new_record = Record(
@@ -172,6 +524,8 @@ def signup():
             {'user': user_data}, 
             status_code=201
         )
+    except PasswordPoolBusy:
+        return password_pool_busy_response()
     except Exception as e:
         return create_response(False, f"An error occurred: {str(e)}", status_code=500)
 
@@ -193,6 +547,11 @@ def login():
         
         if not user.verify_password(password):
             return create_response(False, "Invalid email or password", status_code=401)
+
+        # Upgrade the stored hash when the configured bcrypt cost has changed
+        if user.needs_rehash():
+            user.password_hash = User.hash_password(password)
+            user.update()
         
         token = AuthToken.generate_token(user._id)
 
@@ -207,6 +566,8 @@ def login():
             "Login successful", 
             {'user': user_data}
         )
+    except PasswordPoolBusy:
+        return password_pool_busy_response()
     except Exception as e:
         return create_response(False, f"An error occurred: {str(e)}", status_code=500)
 
@@ -214,24 +575,9 @@ def login():
 def verify_token():
     try:
         data = request.get_json()
-        token = data.get('token')
-        
-        if not token:
-            return create_response(False, "Token is required", status_code=400)
-        
-        user_id = AuthToken.verify_token(token)
-        if not user_id:
-            return create_response(False, "Invalid or expired token", status_code=401)
-        
-        user = User.find_by_id(user_id)
-        if not user:
-            return create_response(False, "User not found", status_code=404)
-        
-        user_data = {
-            'id': str(user._id),
-            'username': user.username,
-            'email': user.email
-        }
+        user_data, error = authenticate(data.get('token'))
+        if error:
+            return error
         
         return create_response(True, "Token is valid", {'user': user_data})
         
@@ -244,25 +590,28 @@ def verify_token():
 def create_session():
     try:
         data = request.get_json()
-        required_fields = [
-            'user_id', 'username', 'date', 'time_started', 'total_hours',
-            'intervals', 'time_per_interval', 'time_hair', 'time_nail',
-            'time_eye', 'time_nose', 'time_unfocused', 'time_paused'
-        ]
-        for field in required_fields:
-            if field not in data:
-                return create_response(False, f"{field} is required", status_code=400)
+        # Checked up front in both modes; a queued session must not fail in the worker
+        error = Session.validation_error(data)
+        if error:
+            return create_response(False, error, status_code=400)
+        if Config.SESSION_INGEST_MODE == 'queue':
+            if data['user_id'] and not ObjectId.is_valid(str(data['user_id'])):
+                return create_response(False, "User not found", status_code=404)
+            key, queued = session_queue.enqueue(data)
+            return create_response(True, "Session queued", {'idempotency_key': key, 'queued': queued}, status_code=202)
+
         #Check if user exists
         if data['user_id'] and not User.find_by_id(data['user_id']):
             return create_response(False, "User not found", status_code=404)
         new_session = Session.from_dict(data)
         new_session.save()
+        DailyActivity.add_session(new_session.to_dict())
 
         # Update user record
-        user_record = Record.find_by_user_id(data['user_id'])
-        print("user_record:", user_record)
-        if user_record:
-            user_record.increment_sessions(
+        if data['user_id']:
+            Record.increment_for_user(
+                user_id=data['user_id'],
+                username=data['username'],
                 hours=data['total_hours'],
                 intervals=data['intervals'],
                 time_hair=data['time_hair'],
@@ -272,26 +621,120 @@ def create_session():
                 time_unfocused=data['time_unfocused'],
                 time_paused=data['time_paused']
             )
+            DataVersion.bump(data['user_id'])
         
         return create_response(True, "Session created successfully", {'session_id': str(new_session._id)}, status_code=201)
 
     except Exception as e:
         return create_response(False, f"An error occurred: {str(e)}", status_code=500)     
 
+#Create many sessions at once (offline clients, migrations)
+@app.route('/api/create-sessions', methods=['POST'])
+def create_sessions():
+    try:
+        data = request.get_json()
+        items = data.get('sessions')
+        if not isinstance(items, list) or not items:
+            return create_response(False, "sessions must be a non-empty list", status_code=400)
+        if len(items) > Config.SESSION_BATCH_MAX:
+            return create_response(False, f"At most {Config.SESSION_BATCH_MAX} sessions per batch", status_code=400)
+
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            # Rejected before anything is written, so a bad item can't fail the batch
+            error = Session.validation_error(item)
+            if error:
+                results[index] = {'index': index, 'success': False, 'message': error}
+                continue
+            valid.append(index)
+
+        created = 0
+        if valid:
+            statuses = write_sessions([items[index] for index in valid], [items[index].get('idempotency_key') for index in valid])
+            for index, (status, detail) in zip(valid, statuses):
+                if status == 'created':
+                    created += 1
+                    results[index] = {'index': index, 'success': True, 'session_id': str(detail)}
+                elif status == 'duplicate':
+                    # Already stored by an earlier attempt; not counted again
+                    results[index] = {'index': index, 'success': True, 'duplicate': True}
+                else:
+                    results[index] = {'index': index, 'success': False, 'message': detail}
+
+        all_ok = all(result['success'] for result in results)
+        return create_response(
+            all_ok,
+            f"{created} of {len(items)} sessions created",
+            {'results': results},
+            status_code=201 if all_ok else 207
+        )
+
+    except Exception as e:
+        return create_response(False, f"An error occurred: {str(e)}", status_code=500)
+
+def parse_page_args(default_limit):
+    """Read ?limit=, ?cursor= and ?fields= for the session listing endpoints.
+
+    Returns (limit, cursor, fields); raises ValueError with a client-facing message.
+    """
+    limit = request.args.get('limit', default_limit)
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if not 1 <= limit <= Config.SESSION_PAGE_MAX:
+            raise ValueError(f"limit must be between 1 and {Config.SESSION_PAGE_MAX}")
+
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in SESSION_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    cursor = request.args.get('cursor') or None
+    if cursor:
+        Session.decode_cursor(cursor)
+    return limit, cursor, fields
+
+def user_data_etag(user_id, **_):
+    """ETag for responses derived only from a user's sessions and the URL."""
+    return f"{user_id}-{DataVersion.get(user_id)}"
+
+def session_etag(session_id):
+    user_id = Session.find_user_id(session_id)
+    if not user_id:
+        return None
+    return f"{session_id}-{DataVersion.get(user_id)}"
+
+def activity_etag(user_id):
+    # Without ?end_date= the window ends today, so the day is part of the tag
+    end_date = request.args.get('end_date') or datetime.utcnow().strftime('%Y-%m-%d')
+    return f"{user_id}-{DataVersion.get(user_id)}-{end_date}"
+
 #Get sessions of a user
 @app.route('/api/get-sessions/<user_id>', methods=['GET'])
+@conditional(user_data_etag)
 def get_sessions(user_id):
     try:
+        try:
+            limit, cursor, fields = parse_page_args(default_limit=10)
+        except ValueError as e:
+            return create_response(False, str(e), status_code=400)
+
         if not User.find_by_id(user_id=user_id):
             return create_response(False, "User not found", status_code=404)
-        sessions = Session.get_recent_sessions(user_id=user_id, limit=10)
-        return create_response(True, "Sessions retrieved successfully", {'sessions': [session.to_dict() for session in sessions]})
+        sessions, next_cursor = Session.get_recent_page(user_id=user_id, limit=limit, cursor=cursor, fields=fields)
+        return create_response(True, "Sessions retrieved successfully", {'sessions': sessions, 'next_cursor': next_cursor})
 
     except Exception as e:
         return create_response(False, f"An error occurred: {str(e)}", status_code=500)
 
 #Get specific session by id
 @app.route('/api/get-session/<session_id>', methods=['GET'])
+@conditional(session_etag)
 def get_session(session_id):
     try:
         session = Session.find_by_id(session_id)
@@ -304,6 +747,7 @@ def get_session(session_id):
 
 #Get sessions from date range
 @app.route('/api/get-sessions-from-date/<user_id>/<start_date>/<end_date>', methods=['GET'])
+@conditional(user_data_etag)
 def get_sessions_from_date(user_id, start_date, end_date):
     try:
         if not user_id or not start_date or not end_date:
@@ -325,17 +769,49 @@ def get_sessions_from_date(user_id, start_date, end_date):
         if start > end:
             return create_response(False, "start_date cannot be after end_date", status_code=400)
 
-        sessions = Session.get_user_sessions_in_date_range(
+        # Unpaginated unless ?limit= is given, as before
+        try:
+            limit, cursor, fields = parse_page_args(default_limit=None)
+        except ValueError as e:
+            return create_response(False, str(e), status_code=400)
+
+        sessions, next_cursor = Session.get_date_range_page(
             user_id=user_id,
             start_date=start_date,
-            end_date=end_date
+            end_date=end_date,
+            limit=limit,
+            cursor=cursor,
+            fields=fields
         )
-        return create_response(True, "Sessions retrieved successfully", {'sessions': [session.to_dict() for session in sessions]})
+        return create_response(True, "Sessions retrieved successfully", {'sessions': sessions, 'next_cursor': next_cursor})
+
+    except Exception as e:
+        return create_response(False, f'An error occurred: {str(e)}', status_code=500)
+
+#Get weekly/monthly/habit/hour-of-day summaries for a date range
+@app.route('/api/analytics/<user_id>/<start_date>/<end_date>', methods=['GET'])
+@conditional(user_data_etag)
+def get_analytics(user_id, start_date, end_date):
+    try:
+        try:
+            start = datetime.strptime(start_date, '%Y-%m-%d')
+            end = datetime.strptime(end_date, '%Y-%m-%d')
+        except ValueError:
+            return create_response(False, "Dates must be in YYYY-MM-DD format", status_code=400)
+        if start > end:
+            return create_response(False, "start_date cannot be after end_date", status_code=400)
+
+        if not User.find_by_id(user_id=user_id):
+            return create_response(False, "User not found", status_code=404)
+
+        analytics = Session.get_analytics(user_id=user_id, start_date=start_date, end_date=end_date)
+        return create_response(True, "Analytics retrieved successfully", {'analytics': analytics})
 
     except Exception as e:
         return create_response(False, f'An error occurred: {str(e)}', status_code=500)
 
 @app.route('/api/get-record/<user_id>', methods=['GET'])
+@conditional(user_data_etag)
 def get_record(user_id):
     try:
         record = Record.find_by_user_id(user_id=user_id)
@@ -347,6 +823,174 @@ def get_record(user_id):
     except Exception as e:
         return create_response(False, f'An error occurred: {str(e)}', status_code=500)
 
+#Get per-day activity for the profile heatmap
+@app.route('/api/activity/<user_id>', methods=['GET'])
+@conditional(activity_etag)
+def get_activity(user_id):
+    try:
+        if not User.find_by_id(user_id=user_id):
+            return create_response(False, "User not found", status_code=404)
+
+        # The client passes its local "today" so days line up with its calendar
+        end_date = request.args.get('end_date') or datetime.utcnow().strftime('%Y-%m-%d')
+        try:
+            datetime.strptime(end_date, '%Y-%m-%d')
+        except ValueError:
+            return create_response(False, "end_date must be in YYYY-MM-DD format", status_code=400)
+
+        activity = DailyActivity.get_activity(user_id=user_id, end_date=end_date, days=365)
+        return create_response(True, "Activity retrieved successfully", {'activity': [day.to_dict() for day in activity]})
+
+    except Exception as e:
+        return create_response(False, f'An error occurred: {str(e)}', status_code=500)
+
+#Stream a user's full session history as NDJSON or CSV
+@app.route('/api/export/<user_id>', methods=['GET'])
+def export_sessions(user_id):
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return create_response(False, f"format must be one of: {', '.join(EXPORT_FORMATS)}", status_code=400)
+
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        try:
+            for date in (start_date, end_date):
+                if date:
+                    datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            return create_response(False, "Dates must be in YYYY-MM-DD format", status_code=400)
+
+        try:
+            _, _, fields = parse_page_args(default_limit=None)
+        except ValueError as e:
+            return create_response(False, str(e), status_code=400)
+        fields = fields or SESSION_FIELDS
+
+        if not User.find_by_id(user_id=user_id):
+            return create_response(False, "User not found", status_code=404)
+
+        documents = Session.iter_user_sessions(user_id, start_date=start_date, end_date=end_date, fields=fields)
+        body = chunks(export_rows(documents, fields), ['session_id'] + fields, export_format)
+        mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        return Response(body, mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename="sessions-{user_id}.{export_format}"'
+        })
+
+    except Exception as e:
+        return create_response(False, f'An error occurred: {str(e)}', status_code=500)
+
+#Top users for a metric (hours, sessions, focus, habits), paginated by offset
+@app.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    try:
+        metric = request.args.get('metric', 'hours')
+        if metric not in METRICS:
+            return create_response(False, f"metric must be one of: {', '.join(METRICS)}", status_code=400)
+        try:
+            limit = int(request.args.get('limit', 20))
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return create_response(False, "limit and offset must be integers", status_code=400)
+        if not 1 <= limit <= Config.LEADERBOARD_PAGE_MAX or offset < 0:
+            return create_response(False, f"limit must be between 1 and {Config.LEADERBOARD_PAGE_MAX} and offset at least 0", status_code=400)
+
+        entries, total = leaderboard.top(metric, offset=offset, limit=limit)
+        next_offset = offset + limit if offset + limit < total else None
+        return create_response(True, "Leaderboard retrieved successfully", {
+            'metric': metric,
+            'entries': entries,
+            'total': total,
+            'next_offset': next_offset
+        })
+
+    except LeaderboardWarming:
+        return leaderboard_warming_response()
+    except Exception as e:
+        return create_response(False, f'An error occurred: {str(e)}', status_code=500)
+
+#Rank and percentile of one user for a metric
+@app.route('/api/rank/<user_id>', methods=['GET'])
+def get_rank(user_id):
+    try:
+        metric = request.args.get('metric', 'hours')
+        if metric not in METRICS:
+            return create_response(False, f"metric must be one of: {', '.join(METRICS)}", status_code=400)
+
+        rank = leaderboard.rank(metric, user_id)
+        if not rank:
+            return create_response(False, "User has no ranked record", status_code=404)
+        return create_response(True, "Rank retrieved successfully", {'metric': metric, 'rank': rank})
+
+    except LeaderboardWarming:
+        return leaderboard_warming_response()
+    except Exception as e:
+        return create_response(False, f'An error occurred: {str(e)}', status_code=500)
+
+@app.cli.command('backfill-activity')
+def backfill_activity():
+    """Rebuild the daily activity rollups from existing sessions."""
+    for user_id in Session.distinct_user_ids():
+        days = DailyActivity.rebuild_for_user(user_id)
+        DataVersion.bump(user_id)
+        print(f"{user_id}: {days} days")
+
+@app.cli.command('export-sessions')
+@click.argument('user_id')
+@click.option('--format', 'export_format', type=click.Choice(FILE_FORMATS), default='ndjson')
+@click.option('--out', required=True, help='output file')
+@click.option('--start-date', help='YYYY-MM-DD, inclusive')
+@click.option('--end-date', help='YYYY-MM-DD, inclusive')
+def export_sessions_command(user_id, export_format, out, start_date, end_date):
+    """Write a user's sessions to a file without holding them in memory."""
+    documents = Session.iter_user_sessions(user_id, start_date=start_date, end_date=end_date)
+    try:
+        count = write_file(export_rows(documents, SESSION_FIELDS), ['session_id'] + SESSION_FIELDS, out, export_format)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    print(f"Exported {count} sessions to {out}")
+
+@app.cli.command('migrate-session-buckets')
+def migrate_session_buckets():
+    """Copy session documents into per-month buckets; safe to re-run.
+
+    Run it, set SESSION_STORAGE=buckets and restart, then run it once more to
+    pick up sessions written in between. The sessions collection is left as is.
+    """
+    SessionBucket.ensure_indexes()
+    for user_id in sessions_collection.distinct('user_id'):
+        copied, present, failed = Session.migrate_to_buckets(user_id)
+        in_buckets = sum(month['sessions'] for month in SessionBucket.monthly_totals(user_id))
+        print(f"{user_id}: {copied} copied, {present} already present, {failed} failed, {in_buckets} in buckets")
+
+@app.cli.command('drain-session-queue')
+def drain_session_queue():
+    """Run session queue workers in the foreground (e.g. as a dedicated process)."""
+    session_queue.ensure_indexes()
+    print(f"Draining the session queue with {session_queue.workers} worker(s)")
+    session_queue.ensure_started()
+    try:
+        while True:
+            time.sleep(60)
+            print(session_queue.stats())
+    except KeyboardInterrupt:
+        session_queue.stop()
+
+def ensure_indexes():
+    """Create the indexes the model queries rely on; safe to run repeatedly."""
+    for model in (User, Record, Session, DailyActivity):
+        model.ensure_indexes()
+    for component in (ai_cache, ip_buckets, user_buckets, single_flight):
+        if hasattr(component, 'ensure_indexes'):
+            component.ensure_indexes()
+    session_queue.ensure_indexes()
+
+@app.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    """Create or verify MongoDB indexes."""
+    ensure_indexes()
+    print("Indexes are in place")
+
 @app.route('/')
 def home():
     return jsonify({"message": "Flask backend is running!"})
@@ -358,16 +1002,10 @@ def get_data():
 
 def authenticateDB():
     try:
-        client = MongoClient(
-            Config.MONGO_URI,
-            serverSelectionTimeoutMS=5000,  # 5 second timeout
-            connectTimeoutMS=30000,
-            socketTimeoutMS=30000
-        )        
-        
+        client = get_client()
         client.admin.command('ping')
         print("MongoDB server is reachable")
-        db = client.get_database("level_up")
+        db = get_db()
         collection_names = db.list_collection_names()
         print(f"Database access successful. Collections: {collection_names}")
         return True
@@ -391,6 +1029,8 @@ def authenticateDB():
 if __name__ == '__main__':
     print("Testing MongoDB connection on startup...")
     if authenticateDB():
+        ensure_indexes()
+        leaderboard.ensure_warming()
         print("MongoDB connection verified. Starting Flask server...")
         app.run(debug=True, host='0.0.0.0', port=5001)
     else:
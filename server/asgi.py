@@ -0,0 +1,234 @@
+"""
+ASGI entry point: uvicorn asgi:app --port 5001
+
+/api/ai and /api/tts run as native async handlers on the async Gemini and
+ElevenLabs clients, so slow upstream calls don't hold a worker thread. Every
+other route is served by the Flask app from app.py through a WSGI bridge.
+
+Mongo access stays on the synchronous PyMongo client. The native handlers only
+touch Mongo through the optional shared AI cache and the Mongo admission
+backends, and those calls run in the thread pool. The bridged Flask routes run
+in threads anyway, so an async driver (Motor) would not free them.
+"""
+import contextlib
+
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app,
+    ai_cache,
+    tts_cache,
+    AI_MODEL,
+    AI_PROMPT,
+    TTS_VOICE_ID,
+    TTS_MODEL_ID,
+    TTS_OUTPUT_FORMAT,
+    TTS_AUDIO_MAX_AGE,
+    admit_upstream,
+    client_ip,
+    upstream_slots
+)
+from admission import AsyncSingleFlight, Rejected
+from auth import verify_token_cached
+from leaderboard import leaderboard
+from cache import normalize_prompt, hash_key
+from config import Config
+from metrics import time_upstream
+from upstream import get_gemini_client, get_async_elevenlabs_client
+
+
+single_flight = AsyncSingleFlight()
+
+
+async def admit(request, data):
+    """Async counterpart of app.admit_request; the buckets may live in Mongo, so run it off the loop."""
+    header = request.headers.get("authorization", "")
+    token = header[len("Bearer "):].strip() if header.startswith("Bearer ") else data.get("token")
+    ip = client_ip(request.headers.get("x-forwarded-for"), request.client.host if request.client else None)
+
+    def check():
+        admit_upstream(ip, verify_token_cached(token) if token else None)
+    await run_in_threadpool(check)
+
+
+def rejected_response(e):
+    return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": str(e.retry_after)})
+
+
+async def generate_answer(message, cache_key):
+    with upstream_slots, time_upstream('gemini', 'generate_content'):
+        response = await get_gemini_client().aio.models.generate_content(
+            model=AI_MODEL,
+            contents=AI_PROMPT.format(message=message)
+        )
+    if ai_cache is not None and response.text:
+        await run_in_threadpool(ai_cache.set, cache_key, response.text)
+    return response.text
+
+
+async def ai(request):
+    data = await request.json()
+    message = data.get("message", "")
+
+    cache_key = hash_key(AI_MODEL, normalize_prompt(message))
+    if ai_cache is not None:
+        # The Mongo-backed cache blocks, so keep it off the event loop
+        cached = await run_in_threadpool(ai_cache.get, cache_key)
+        if cached is not None:
+            return JSONResponse({"response": cached})
+
+    try:
+        await admit(request, data)
+        text = await single_flight.do(cache_key, lambda: generate_answer(message, cache_key))
+    except Rejected as e:
+        return rejected_response(e)
+    return JSONResponse({"response": text})
+
+
+def cached_audio_response(request, audio_key, path):
+    """Async counterpart of app.send_cached_audio."""
+    etag = f'"{audio_key}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={TTS_AUDIO_MAX_AGE}, immutable",
+        "Content-Location": f"/api/tts/{audio_key}.mp3"
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="audio/mpeg", headers=headers)
+
+
+async def stream_audio(audio_key, audio_stream):
+    """Async counterpart of app.stream_tts_audio."""
+    first_chunk = None
+    with time_upstream('elevenlabs', 'stream_first_chunk'):
+        async for chunk in audio_stream:
+            if chunk:
+                first_chunk = chunk
+                break
+    if first_chunk is None:
+        return JSONResponse({"error": "Failed to generate audio"}, status_code=500)
+
+    async def generate():
+        received = [first_chunk]
+        total_bytes = len(first_chunk)
+        yield first_chunk
+        try:
+            async for chunk in audio_stream:
+                if not chunk:
+                    continue
+                total_bytes += len(chunk)
+                if total_bytes > Config.TTS_STREAM_MAX_BYTES:
+                    print(f"TTS stream for {audio_key} exceeded {Config.TTS_STREAM_MAX_BYTES} bytes, truncating")
+                    return
+                received.append(chunk)
+                yield chunk
+        except Exception as e:
+            print(f"Error streaming TTS audio: {e}")
+            return
+
+        if tts_cache is not None:
+            await run_in_threadpool(tts_cache.put, audio_key, b"".join(received))
+
+    return StreamingResponse(generate(), media_type="audio/mpeg", headers={"X-Audio-Key": audio_key})
+
+
+async def release_when_done(body_iterator):
+    """Keep a streaming response's upstream slot until it ends or the client goes away."""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        upstream_slots.release()
+
+
+async def tts(request):
+    data = await request.json()
+    message = data.get("message")
+    stream = bool(data.get("stream")) or request.query_params.get("stream") == "1"
+
+    if not message:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+
+    audio_key = hash_key(message, TTS_VOICE_ID, TTS_MODEL_ID, TTS_OUTPUT_FORMAT)
+    if tts_cache is not None:
+        cached_path = tts_cache.get_path(audio_key)
+        if cached_path:
+            return cached_audio_response(request, audio_key, cached_path)
+
+    async_elevenlabs_client = get_async_elevenlabs_client()
+    if not async_elevenlabs_client:
+        return JSONResponse({"error": "Server is missing ElevenLabs API key"}, status_code=500)
+
+    async def convert():
+        with upstream_slots, time_upstream('elevenlabs', 'convert'):
+            audio_stream = async_elevenlabs_client.text_to_speech.convert(
+                text=message,
+                voice_id=TTS_VOICE_ID,
+                model_id=TTS_MODEL_ID,
+                output_format=TTS_OUTPUT_FORMAT,
+            )
+            audio_bytes = b"".join([chunk async for chunk in audio_stream if chunk])
+        if tts_cache is not None and audio_bytes:
+            await run_in_threadpool(tts_cache.put, audio_key, audio_bytes)
+        return audio_bytes
+
+    try:
+        await admit(request, data)
+        if stream:
+            upstream_slots.acquire()
+            try:
+                audio_stream = async_elevenlabs_client.text_to_speech.stream(
+                    text=message,
+                    voice_id=TTS_VOICE_ID,
+                    model_id=TTS_MODEL_ID,
+                    output_format=TTS_OUTPUT_FORMAT,
+                )
+                response = await stream_audio(audio_key, audio_stream)
+            except BaseException:
+                upstream_slots.release()
+                raise
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = release_when_done(response.body_iterator)
+            else:
+                upstream_slots.release()
+            return response
+
+        audio_bytes = await single_flight.do(audio_key, convert)
+        if not audio_bytes:
+            return JSONResponse({"error": "Failed to generate audio"}, status_code=500)
+
+        cached_path = tts_cache.get_path(audio_key) if tts_cache is not None else None
+        if cached_path:
+            return cached_audio_response(request, audio_key, cached_path)
+        return Response(audio_bytes, media_type="audio/mpeg")
+
+    except Rejected as e:
+        return rejected_response(e)
+    except Exception as e:
+        print(f"Error generating TTS audio: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Build the leaderboards while the worker takes its first requests
+    leaderboard.ensure_warming()
+    yield
+
+
+app = Starlette(
+    lifespan=lifespan,
+    routes=[
+        Route("/api/ai", ai, methods=["POST"]),
+        Route("/api/tts", tts, methods=["POST"]),
+        Mount("/", app=WsgiToAsgi(flask_app))
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])]
+)
@@ -0,0 +1,69 @@
+import time
+from functools import wraps
+from flask import request, g
+from cache import TTLCache, hash_key
+from config import Config
+from models.AuthToken import AuthToken
+from models.User import User
+from utils import create_response
+
+# sha256(token) -> (user_id, exp); entries are also checked against the token's own expiry
+token_cache = TTLCache(max_entries=Config.AUTH_CACHE_MAX_ENTRIES, ttl=Config.AUTH_CACHE_TTL_SECONDS)
+
+
+def verify_token_cached(token):
+    """Like AuthToken.verify_token, but remembers tokens that verified successfully."""
+    key = hash_key(token)
+    cached = token_cache.get(key)
+    if cached is not None:
+        user_id, exp = cached
+        if exp > time.time():
+            return user_id
+        token_cache.delete(key)
+
+    payload = AuthToken.decode_token(token)
+    if not payload:
+        return None
+    token_cache.set(key, (payload['user_id'], payload['exp']))
+    return payload['user_id']
+
+
+def authenticate(token):
+    """Resolve a token to public user data.
+
+    Returns (user_data, None) on success, or (None, error_response).
+    """
+    if not token:
+        return None, create_response(False, "Token is required", status_code=400)
+
+    user_id = verify_token_cached(token)
+    if not user_id:
+        return None, create_response(False, "Invalid or expired token", status_code=401)
+
+    user_data = User.get_public_data(user_id)
+    if not user_data:
+        return None, create_response(False, "User not found", status_code=404)
+    return user_data, None
+
+
+def request_token():
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip()
+    data = request.get_json(silent=True) or {}
+    return data.get('token')
+
+
+def require_auth(f):
+    """Reject the request unless it carries a valid token; the user's public data is put in g.user."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = request_token()
+        if not token:
+            return create_response(False, "Authentication required", status_code=401)
+        user_data, error = authenticate(token)
+        if error:
+            return error
+        g.user = user_data
+        return f(*args, **kwargs)
+    return decorated
@@ -0,0 +1,451 @@
+"""
+Load test for the Flask API with stubbed Gemini/ElevenLabs clients.
+
+    python benchmarks/api_bench.py run [--mongo-uri mongodb://localhost:27017] [--asgi] [--out results.json]
+    python benchmarks/api_bench.py compare before.json after.json
+
+Without --mongo-uri the app runs against mongomock (pip install mongomock).
+Users are seeded with 10 to 10,000 sessions each, then a weighted mix of
+signup/login/create-session/get-sessions/get-record/ai/tts requests is driven
+through Flask's test client from a thread pool. Throughput and latency
+percentiles are collected per endpoint, plus the peak memory allocated per
+request (tracemalloc, measured in a separate serial pass). Results are saved
+as JSON so runs can be compared across commits.
+
+With --asgi the same mix is then driven through asgi.app as well, with
+httpx.AsyncClient and --concurrency tasks on one event loop, and req/s and
+p99 are printed side by side for the sync and async servers. Both passes
+start with empty AI and TTS caches.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(SERVER_DIR, 'benchmarks', 'results')
+
+PASSWORD = 'Benchmark1'
+PROMPTS = [
+    "What's the pomodoro technique?",
+    "What is your name?",
+    "How do I stop touching my face while studying?",
+    "How long should a study break be?",
+    "Give me a tip to stay focused"
+]
+DEFAULT_MIX = 'signup=1,login=4,create_session=10,get_sessions=20,get_record=20,ai=5,tts=5'
+
+
+def install_upstream_stubs(latency):
+    """Replace google.genai and elevenlabs with fakes that sleep for `latency` seconds."""
+
+    class FakeResponse:
+        def __init__(self, text):
+            self.text = text
+
+    class FakeModels:
+        def generate_content(self, model, contents):
+            time.sleep(latency)
+            return FakeResponse("Take a short break every 25 minutes. Then get back to it.")
+
+        def generate_content_stream(self, model, contents):
+            time.sleep(latency)
+            for part in ("Take a short break every 25 minutes. ", "Then get back to it."):
+                yield FakeResponse(part)
+
+    class FakeAsyncModels:
+        async def generate_content(self, model, contents):
+            await asyncio.sleep(latency)
+            return FakeResponse("Take a short break every 25 minutes. Then get back to it.")
+
+    class FakeGenaiClient:
+        def __init__(self, api_key=None):
+            self.models = FakeModels()
+            self.aio = types.SimpleNamespace(models=FakeAsyncModels())
+
+    class FakeTextToSpeech:
+        def convert(self, text, **kwargs):
+            time.sleep(latency)
+            for _ in range(8):
+                yield os.urandom(4096)
+
+        stream = convert
+
+    class FakeAsyncTextToSpeech:
+        async def convert(self, text, **kwargs):
+            await asyncio.sleep(latency)
+            for _ in range(8):
+                yield os.urandom(4096)
+
+        stream = convert
+
+    class FakeElevenLabs:
+        def __init__(self, api_key=None):
+            self.text_to_speech = FakeTextToSpeech()
+
+    class FakeAsyncElevenLabs:
+        def __init__(self, api_key=None):
+            self.text_to_speech = FakeAsyncTextToSpeech()
+
+    google = types.ModuleType('google')
+    genai = types.ModuleType('google.genai')
+    genai.Client = FakeGenaiClient
+    google.genai = genai
+    elevenlabs = types.ModuleType('elevenlabs')
+    elevenlabs_client = types.ModuleType('elevenlabs.client')
+    elevenlabs_client.ElevenLabs = FakeElevenLabs
+    elevenlabs_client.AsyncElevenLabs = FakeAsyncElevenLabs
+    elevenlabs_play = types.ModuleType('elevenlabs.play')
+    elevenlabs_play.play = lambda audio: None
+    sys.modules.update({
+        'google': google,
+        'google.genai': genai,
+        'elevenlabs': elevenlabs,
+        'elevenlabs.client': elevenlabs_client,
+        'elevenlabs.play': elevenlabs_play
+    })
+    os.environ.setdefault('ELEVEN_LABS', 'benchmark')
+    os.environ.setdefault('GEMINI_KEY', 'benchmark')
+
+
+def load_app(args):
+    os.environ['MONGO_DB_NAME'] = args.db_name
+    os.environ['TTS_CACHE_DIR'] = tempfile.mkdtemp(prefix='lockin-bench-tts-')
+    # Every simulated client shares one IP, so rate limiting would turn the load into 429s
+    os.environ['RATE_LIMIT_BACKEND'] = 'none'
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+    install_upstream_stubs(args.upstream_latency_ms / 1000)
+    sys.path.insert(0, SERVER_DIR)
+
+    import database
+    if not args.mongo_uri:
+        import mongomock
+        database.MongoClient = mongomock.MongoClient
+
+    import app as app_module
+    database.get_client().drop_database(args.db_name)
+    app_module.ensure_indexes()
+    reset_caches(app_module)
+    return app_module
+
+
+def reset_caches(app_module):
+    if app_module.ai_cache is not None:
+        app_module.ai_cache.clear()
+    if app_module.tts_cache is not None:
+        shutil.rmtree(app_module.tts_cache.directory, ignore_errors=True)
+        os.makedirs(app_module.tts_cache.directory)
+        app_module.tts_cache.trim()
+
+
+def session_payload(user_id, username, day):
+    return {
+        'user_id': user_id,
+        'username': username,
+        'date': day.strftime('%Y-%m-%d'),
+        'time_started': f'{random.randint(6, 23):02d}:{random.randint(0, 59):02d}',
+        'total_hours': round(random.uniform(0.25, 3), 2),
+        'intervals': random.randint(0, 6),
+        'time_per_interval': random.choice([15, 25, 30, 45]),
+        'time_hair': random.randint(0, 300),
+        'time_nail': random.randint(0, 300),
+        'time_eye': random.randint(0, 300),
+        'time_nose': random.randint(0, 300),
+        'time_unfocused': random.randint(0, 1800),
+        'time_paused': random.randint(0, 1800)
+    }
+
+
+def seed(app_module, session_counts):
+    """Create one user per entry of `session_counts`, each with that many sessions."""
+    from models.User import User
+    from models.Record import Record
+    from models.Session import Session
+    from models.DailyActivity import DailyActivity
+
+    password_hash = User.hash_password(PASSWORD)
+    users = []
+    today = datetime.utcnow()
+    for i, count in enumerate(session_counts):
+        user = User(username=f'bench_{i}', email=f'bench_{i}@example.com', password_hash=password_hash).save()
+        Record(
+            user_id=user._id, username=user.username, total_sessions=0, total_intervals=0, total_hours=0,
+            time_hair=0, time_nail=0, time_eye=0, time_nose=0, time_unfocused=0, time_paused=0
+        ).save()
+        user_id = str(user._id)
+        payloads = [session_payload(user_id, user.username, today - timedelta(days=random.randint(0, 364))) for _ in range(count)]
+        for start in range(0, count, 1000):
+            batch = payloads[start:start + 1000]
+            Session.insert_many([Session.from_dict(p) for p in batch], [None] * len(batch))
+            Record.increment_for_sessions(batch)
+        DailyActivity.rebuild_for_user(user_id)
+        users.append({'id': user_id, 'username': user.username, 'email': user.email, 'sessions': count})
+    return users
+
+
+class Driver:
+    """Issues one request of a given kind against the app's test client."""
+
+    def __init__(self, app_module, users):
+        self.app = app_module.app
+        self.users = users
+        self._signup_counter = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def prepare(self, kind):
+        """(method, path, json body) for one request of `kind`."""
+        user = random.choice(self.users)
+        if kind == 'signup':
+            with self._lock:
+                self._signup_counter += 1
+                n = self._signup_counter
+            return 'POST', '/api/signup', {
+                'username': f'new_{n}_{os.getpid() % 1000}', 'email': f'new_{n}@example.com', 'password': PASSWORD
+            }
+        if kind == 'login':
+            return 'POST', '/api/login', {'email': user['email'], 'password': PASSWORD}
+        if kind == 'create_session':
+            return 'POST', '/api/create-session', session_payload(user['id'], user['username'], datetime.utcnow())
+        if kind == 'get_sessions':
+            return 'GET', f"/api/get-sessions/{user['id']}", None
+        if kind == 'get_record':
+            return 'GET', f"/api/get-record/{user['id']}", None
+        if kind == 'ai':
+            return 'POST', '/api/ai', {'message': random.choice(PROMPTS)}
+        if kind == 'tts':
+            return 'POST', '/api/tts', {'message': random.choice(PROMPTS)}
+        raise ValueError(f'Unknown request kind: {kind}')
+
+    def request(self, kind):
+        method, path, body = self.prepare(kind)
+        return self.client.open(path, method=method, json=body)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'errors': errors,
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else 0,
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0,
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p90_ms': round(percentile(values, 90) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if values else 0
+    }
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        kind, weight = part.split('=')
+        weights[kind.strip()] = float(weight)
+    return weights
+
+
+def run_load(driver, weights, total_requests, concurrency):
+    kinds = random.choices(list(weights), weights=list(weights.values()), k=total_requests)
+    latencies = {kind: [] for kind in weights}
+    errors = {kind: 0 for kind in weights}
+    lock = threading.Lock()
+
+    def one(kind):
+        start = time.perf_counter()
+        response = driver.request(kind)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[kind].append(elapsed)
+            if response.status_code >= 400:
+                errors[kind] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, kinds))
+    elapsed = time.perf_counter() - started
+
+    endpoints = {kind: summarize(latencies[kind], errors[kind], elapsed) for kind in weights}
+    overall = summarize([v for values in latencies.values() for v in values], sum(errors.values()), elapsed)
+    return endpoints, overall
+
+
+def run_load_asgi(driver, asgi_app, weights, total_requests, concurrency):
+    """run_load against the ASGI app: `concurrency` tasks on one event loop instead of threads."""
+    import httpx
+
+    kinds = iter(random.choices(list(weights), weights=list(weights.values()), k=total_requests))
+    latencies = {kind: [] for kind in weights}
+    errors = {kind: 0 for kind in weights}
+
+    async def load():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+            async def worker():
+                for kind in kinds:
+                    method, path, body = driver.prepare(kind)
+                    start = time.perf_counter()
+                    response = await client.request(method, path, json=body)
+                    latencies[kind].append(time.perf_counter() - start)
+                    if response.status_code >= 400:
+                        errors[kind] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return time.perf_counter() - started
+
+    elapsed = asyncio.run(load())
+    endpoints = {kind: summarize(latencies[kind], errors[kind], elapsed) for kind in weights}
+    overall = summarize([v for values in latencies.values() for v in values], sum(errors.values()), elapsed)
+    return endpoints, overall
+
+
+def measure_allocations(driver, kinds, samples):
+    """Peak traced memory per request, measured serially so threads don't mix."""
+    allocations = {}
+    tracemalloc.start()
+    for kind in kinds:
+        peaks = []
+        for _ in range(samples):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            driver.request(kind)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        allocations[kind] = {'peak_alloc_kb_mean': round(sum(peaks) / len(peaks) / 1024, 1)}
+    tracemalloc.stop()
+    return allocations
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVER_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    random.seed(args.seed)
+    app_module = load_app(args)
+    session_counts = [int(n) for n in args.sessions_per_user.split(',')] * args.users_per_size
+    print(f'Seeding {len(session_counts)} users / {sum(session_counts)} sessions...')
+    users = seed(app_module, session_counts)
+
+    driver = Driver(app_module, users)
+    weights = parse_mix(args.mix)
+    print(f'Running {args.requests} requests with concurrency {args.concurrency}...')
+    endpoints, overall = run_load(driver, weights, args.requests, args.concurrency)
+    for kind, allocation in measure_allocations(driver, list(weights), args.alloc_samples).items():
+        endpoints[kind].update(allocation)
+
+    asgi_result = None
+    if args.asgi:
+        import asgi
+        reset_caches(app_module)
+        print(f'Running {args.requests} requests through asgi.app with concurrency {args.concurrency}...')
+        asgi_endpoints, asgi_overall = run_load_asgi(driver, asgi.app, weights, args.requests, args.concurrency)
+        asgi_result = {'overall': asgi_overall, 'endpoints': asgi_endpoints}
+
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'mongo': args.mongo_uri or 'mongomock',
+            'args': {key: value for key, value in vars(args).items() if key != 'func'}
+        },
+        'overall': overall,
+        'endpoints': endpoints
+    }
+    if asgi_result:
+        result['asgi'] = asgi_result
+
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{result['meta']['commit'] or 'local'}-{int(time.time())}.json")
+    with open(out, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    for kind, stats in endpoints.items():
+        print(f"{kind:>15}: {stats['throughput_rps']:>8} req/s  p50 {stats['p50_ms']:>8} ms  "
+              f"p99 {stats['p99_ms']:>8} ms  errors {stats['errors']}  alloc {stats['peak_alloc_kb_mean']} KB")
+    if asgi_result:
+        print(f"\n{'sync vs async':>15}  {'req/s':>22}  {'p99 ms':>22}  {'errors':>10}")
+        rows = [*endpoints.items(), ('overall', overall)]
+        for kind, stats in rows:
+            other = asgi_result['overall'] if kind == 'overall' else asgi_result['endpoints'][kind]
+            print(f"{kind:>15}  {stats['throughput_rps']:>10} -> {other['throughput_rps']:<9}  "
+                  f"{stats['p99_ms']:>10} -> {other['p99_ms']:<9}  {stats['errors']:>4} -> {other['errors']:<4}")
+    print(f'Saved {out}')
+
+
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"{'endpoint':>15}  {'p50 ms':>18}  {'p99 ms':>18}  {'req/s':>18}")
+    for kind in after['endpoints']:
+        old = before['endpoints'].get(kind)
+        new = after['endpoints'][kind]
+        if not old:
+            continue
+        cells = [f"{old[key]:>8} -> {new[key]:<8}" for key in ('p50_ms', 'p99_ms', 'throughput_rps')]
+        print(f'{kind:>15}  ' + '  '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed data, drive traffic and save results')
+    run_parser.add_argument('--mongo-uri', help='use a real MongoDB instead of mongomock')
+    run_parser.add_argument('--db-name', default='lockin_benchmark')
+    run_parser.add_argument('--sessions-per-user', default='10,100,1000,10000')
+    run_parser.add_argument('--users-per-size', type=int, default=2)
+    run_parser.add_argument('--requests', type=int, default=2000)
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--mix', default=DEFAULT_MIX, help='comma separated kind=weight pairs')
+    run_parser.add_argument('--upstream-latency-ms', type=float, default=50)
+    run_parser.add_argument('--alloc-samples', type=int, default=20)
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--asgi', action='store_true', help='also drive the mix through asgi.app and compare')
+    run_parser.add_argument('--out', help='result file (default: benchmarks/results/<commit>-<time>.json)')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='print per-endpoint deltas between two result files')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Year-range reads with one document per session vs per-month buckets.
+
+    python benchmarks/bucket_bench.py [--mongo-uri mongodb://localhost:27017] [--sessions 1000,10000,50000]
+
+For each size, one user gets that many sessions spread over three years in
+the sessions collection; they are then copied into buckets with
+Session.migrate_to_buckets. Each storage mode then times
+get_user_sessions_in_date_range over the last year, the date-range page
+endpoint query, get_recent_sessions(10) and the first page of the recent
+sessions endpoint (get_recent_page, 10 rows), and reports how many documents
+the year-range query has to fetch. In bucket mode the recent queries only
+unwind the newest months that hold enough sessions. Without --mongo-uri it runs on mongomock,
+which is only good for checking results match, not for timings.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_models(args):
+    os.environ['MONGO_DB_NAME'] = args.db_name
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+    sys.path.insert(0, SERVER_DIR)
+
+    import database
+    if not args.mongo_uri:
+        import mongomock
+        database.MongoClient = mongomock.MongoClient
+    database.get_client().drop_database(args.db_name)
+
+    from config import Config
+    from models.Session import Session
+    from models.SessionBucket import SessionBucket
+    Config.SESSION_STORAGE = 'documents'
+    Session.ensure_indexes()
+    SessionBucket.ensure_indexes()
+    return Config, Session, SessionBucket
+
+
+def seed(Session, user_id, count, today):
+    documents = []
+    for _ in range(count):
+        day = today - timedelta(days=random.randint(0, 3 * 365 - 1))
+        documents.append(Session.from_dict({
+            'user_id': user_id,
+            'username': user_id,
+            'date': day.strftime('%Y-%m-%d'),
+            'time_started': f'{random.randint(6, 23):02d}:{random.randint(0, 59):02d}',
+            'total_hours': round(random.uniform(0.25, 3), 2),
+            'intervals': random.randint(0, 6),
+            'time_per_interval': 25,
+            'time_hair': random.randint(0, 300),
+            'time_nail': random.randint(0, 300),
+            'time_eye': random.randint(0, 300),
+            'time_nose': random.randint(0, 300),
+            'time_unfocused': random.randint(0, 1800),
+            'time_paused': random.randint(0, 1800)
+        }))
+    for start in range(0, count, 1000):
+        batch = documents[start:start + 1000]
+        Session.insert_many(batch, [None] * len(batch))
+
+
+def median_ms(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', help='use a real MongoDB instead of mongomock')
+    parser.add_argument('--db-name', default='lockin_bucket_benchmark')
+    parser.add_argument('--sessions', default='1000,10000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    Config, Session, SessionBucket = load_models(args)
+    from models.Session import sessions_collection
+    from models.SessionBucket import session_buckets_collection
+
+    today = datetime.utcnow()
+    start_date = (today - timedelta(days=364)).strftime('%Y-%m-%d')
+    end_date = today.strftime('%Y-%m-%d')
+
+    for count in (int(size) for size in args.sessions.split(',')):
+        user_id = f'bench_{count}'
+        seed(Session, user_id, count, today)
+        Session.migrate_to_buckets(user_id)
+
+        print(f'{count} sessions over 3 years, reading {start_date}..{end_date}:')
+        results = {}
+        for mode in ('documents', 'buckets'):
+            Config.SESSION_STORAGE = mode
+            range_ms, sessions = median_ms(
+                lambda: Session.get_user_sessions_in_date_range(user_id, start_date, end_date), args.repeat)
+            page_ms, _ = median_ms(
+                lambda: Session.get_date_range_page(user_id, start_date, end_date), args.repeat)
+            recent_ms, _ = median_ms(lambda: Session.get_recent_sessions(user_id, 10), args.repeat)
+            first_page_ms, _ = median_ms(lambda: Session.get_recent_page(user_id, 10), args.repeat)
+            if mode == 'documents':
+                fetched = sessions_collection.count_documents({'user_id': user_id, 'date': {'$gte': start_date, '$lte': end_date}})
+            else:
+                fetched = session_buckets_collection.count_documents(
+                    {'user_id': user_id, 'month': SessionBucket.month_range(start_date, end_date)})
+            results[mode] = sorted((s.date, s.time_started, s.total_hours) for s in sessions)
+            print(f'  {mode:<10} range {range_ms:>8.1f} ms   page {page_ms:>8.1f} ms   '
+                  f'recent {recent_ms:>7.1f} ms   recent page {first_page_ms:>7.1f} ms   {fetched:>6} documents fetched')
+        if results['documents'] != results['buckets']:
+            print('  MISMATCH: the two layouts returned different sessions')
+        Config.SESSION_STORAGE = 'documents'
+
+
+if __name__ == '__main__':
+    main()
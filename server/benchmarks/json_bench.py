@@ -0,0 +1,114 @@
+"""
+Serialization benchmark for large API responses.
+
+    python benchmarks/json_bench.py [--sessions 10000] [--repeat 20]
+
+Builds a get-sessions style payload (ObjectId user ids, float fields) and
+times create_response() through Flask's DefaultJSONProvider and through
+json_provider.FastJSONProvider, plus Record.to_dict's float cleanup with the
+old string round-trip against round().
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+from json_provider import FastJSONProvider
+from utils import create_response
+
+
+def build_sessions(count):
+    user_id = ObjectId()
+    sessions = []
+    for i in range(count):
+        sessions.append({
+            '_id': ObjectId(),
+            'user_id': user_id,
+            'username': 'benchmark',
+            'date': f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+            'time_started': f'{i % 24:02d}:{i % 60:02d}',
+            'total_hours': random.random() * 3,
+            'intervals': random.randint(1, 8),
+            'time_per_interval': random.random() * 3600,
+            'time_hair': random.random() * 300,
+            'time_nail': random.random() * 300,
+            'time_eye': random.random() * 300,
+            'time_nose': random.random() * 300,
+            'time_unfocused': random.random() * 600,
+            'time_paused': random.random() * 600
+        })
+    return sessions
+
+
+class ObjectIdJSONProvider(DefaultJSONProvider):
+    """What the app relied on before: the stdlib provider plus str(ObjectId)."""
+
+    @staticmethod
+    def default(obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        return DefaultJSONProvider.default(obj)
+
+
+def time_response(provider_class, payload, repeat):
+    app = Flask(__name__)
+    app.json = provider_class(app)
+    timings = []
+    with app.app_context():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response, _ = create_response(True, 'Sessions retrieved successfully', payload)
+            response.get_data()
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(response.get_data())
+
+
+def time_rounding(values, repeat):
+    def string_round_trip(value):
+        return float(f"{round(value, 2):.2f}")
+
+    results = {}
+    for name, fn in (('string round-trip', string_round_trip), ('round()', lambda value: round(value, 2))):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for value in values:
+                fn(value)
+            timings.append(time.perf_counter() - start)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    payload = {'sessions': build_sessions(args.sessions), 'next_cursor': None}
+
+    print(f'create_response with {args.sessions} sessions (median of {args.repeat}):')
+    baseline, size = time_response(ObjectIdJSONProvider, payload, args.repeat)
+    print(f'  {"stdlib json":<26} {baseline * 1000:>8.1f} ms  {size} bytes')
+    fast, size = time_response(FastJSONProvider, payload, args.repeat)
+    print(f'  {"FastJSONProvider (" + json_provider.BACKEND + ")":<26} {fast * 1000:>8.1f} ms  {size} bytes  ({baseline / fast:.1f}x)')
+
+    values = [value for session in payload['sessions'] for value in session.values() if isinstance(value, float)]
+    print(f'Rounding {len(values)} floats (median of {args.repeat}):')
+    for name, seconds in time_rounding(values, args.repeat).items():
+        print(f'  {name:<26} {seconds * 1000:>8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
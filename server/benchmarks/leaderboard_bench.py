@@ -0,0 +1,135 @@
+"""
+Leaderboard benchmark with synthetic users.
+
+    python benchmarks/leaderboard_bench.py [--users 1000000] [--queries 10000] [--mongo-uri mongodb://localhost:27017]
+
+By default the records are generated in memory and fed to the leaderboard in
+place of Record.iter_for_ranking, so only the index itself is measured. With
+--mongo-uri they are written to a real `records` collection first, and
+loading includes reading them back. The script reports the time and memory
+to build every board (what the server's warm-up thread does while the
+endpoints answer 503), latency percentiles for /api/rank-style and
+/api/leaderboard-style lookups and for applying record updates, plus the
+per-query cost of the naive approach (sort every record on each request) for
+comparison.
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def synthetic_records(count, seed):
+    rng = random.Random(seed)
+    for i in range(count):
+        hours = round(rng.lognormvariate(3, 1.2), 2)
+        yield {
+            'user_id': f'{i:024x}',
+            'username': f'user_{i}',
+            'total_sessions': rng.randint(1, 500),
+            'total_hours': hours,
+            'time_hair': round(hours * rng.random() * 0.05, 2),
+            'time_nail': round(hours * rng.random() * 0.05, 2),
+            'time_eye': round(hours * rng.random() * 0.05, 2),
+            'time_nose': round(hours * rng.random() * 0.05, 2),
+            'time_unfocused': round(hours * rng.random() * 0.3, 2),
+            'time_paused': round(hours * rng.random() * 0.2, 2)
+        }
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    pick = lambda q: timings[min(len(timings) - 1, int(q * len(timings)))] * 1e6
+    return f'p50 {pick(0.5):>7.1f} us   p99 {pick(0.99):>7.1f} us'
+
+
+def timed(fn, args_list):
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def max_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=10000)
+    parser.add_argument('--metric', default='hours')
+    parser.add_argument('--mongo-uri', help='load through a real records collection')
+    parser.add_argument('--db-name', default='lockin_leaderboard_benchmark')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ['MONGO_DB_NAME'] = args.db_name
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+
+    from models.Record import Record, records_collection
+    from leaderboard import Leaderboard, METRICS
+
+    if args.mongo_uri:
+        records_collection.database.client.drop_database(args.db_name)
+        batch = []
+        for record in synthetic_records(args.users, args.seed):
+            batch.append(record)
+            if len(batch) == 10000:
+                records_collection.insert_many(batch)
+                batch = []
+        if batch:
+            records_collection.insert_many(batch)
+        Record.ensure_indexes()
+    else:
+        Record.iter_for_ranking = staticmethod(
+            lambda changed_since=None: [] if changed_since else synthetic_records(args.users, args.seed))
+
+    rss_before = max_rss_mb()
+    board = Leaderboard(refresh_seconds=3600)
+    start = time.perf_counter()
+    board.warm()
+    build_seconds = time.perf_counter() - start
+    total = len(board.board(args.metric))
+    print(f'{total} users on the {args.metric!r} board: all {len(METRICS)} boards built in {build_seconds:.2f} s, '
+          f'~{max_rss_mb() - rss_before:.0f} MB peak RSS growth')
+
+    rng = random.Random(args.seed + 1)
+    user_ids = [f'{rng.randrange(args.users):024x}' for _ in range(args.queries)]
+    print(f'  rank/percentile        {percentiles(timed(board.rank, [(args.metric, user_id) for user_id in user_ids]))}')
+    offsets = [rng.randrange(max(total - 20, 1)) for _ in range(args.queries)]
+    print(f'  page of 20 (random)    {percentiles(timed(board.top, [(args.metric, offset, 20) for offset in offsets]))}')
+    print(f'  page of 20 (top)       {percentiles(timed(board.top, [(args.metric, 0, 20)] * args.queries))}')
+
+    updates = []
+    for user_id in user_ids:
+        record = next(synthetic_records(1, rng.random()))
+        record['user_id'] = user_id
+        updates.append((record,))
+
+    def apply(record):
+        with board._lock:
+            board._put(record)
+    print(f'  record update          {percentiles(timed(apply, updates))}')
+
+    score = METRICS[args.metric]
+    records = list(synthetic_records(args.users, args.seed))
+    start = time.perf_counter()
+    ranked = sorted(records, key=score, reverse=True)
+    mine = score(records[0])
+    sum(1 for record in ranked if score(record) > mine)
+    print(f'  naive sort per query   {(time.perf_counter() - start) * 1000:>7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
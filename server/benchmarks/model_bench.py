@@ -0,0 +1,151 @@
+"""
+Memory and throughput of turning 100k stored sessions into response rows.
+
+    python benchmarks/model_bench.py [--sessions 100000] [--repeat 5] [--mongo-uri mongodb://localhost:27017]
+
+By default the sessions are BSON-encoded once and decoded with bson.decode_all,
+which is what a cursor does with each batch it receives, so only decoding and
+the model layer are measured. Each path is timed on its own (median of
+--repeat runs, with the response JSON encoding as a second column) and then
+run once under tracemalloc for its peak allocation:
+
+- objects: Session.from_dict(...).to_dict() per document, with a plain class
+  (instance __dict__) and with the __slots__ Session
+- row copies: the old find_page path, copying projected fields into a new dict
+- rows in place: the current find_page path (Session.to_rows, no _id decoded)
+- RawBSONDocument: lazy documents, then reading every field into a row
+
+It also reports the size of 100k Session objects held in a list, with and
+without __slots__. With --mongo-uri the sessions are written to a real
+`sessions` collection and Session.get_date_range_page is timed end to end
+against the old find + from_dict + to_dict loop.
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+import bson
+from bson import CodecOptions, ObjectId
+from bson.raw_bson import RawBSONDocument
+
+
+def synthetic_sessions(count, user_id, seed):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            'user_id': user_id,
+            'username': 'benchmark',
+            'date': f'{2020 + i // 336}-{i // 28 % 12 + 1:02d}-{i % 28 + 1:02d}',
+            'time_started': f'{rng.randrange(24):02d}:{rng.randrange(60):02d}',
+            'total_hours': rng.random() * 3,
+            'intervals': rng.randint(1, 8),
+            'time_per_interval': rng.random() * 3600,
+            'time_hair': rng.random() * 300,
+            'time_nail': rng.random() * 300,
+            'time_eye': rng.random() * 300,
+            'time_nose': rng.random() * 300,
+            'time_unfocused': rng.random() * 600,
+            'time_paused': rng.random() * 600
+        }
+
+
+def run(fn, repeat):
+    """(median seconds, peak traced MB) for fn(), collected garbage excluded."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--mongo-uri', help='also time the query path against a real sessions collection')
+    parser.add_argument('--db-name', default='lockin_model_benchmark')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ['MONGO_DB_NAME'] = args.db_name
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+
+    from json_provider import dumps_bytes
+    from models.Session import Session, SESSION_FIELDS, sessions_collection
+
+    # The old model class: same code, attributes in an instance __dict__
+    PlainSession = type('PlainSession', (), {
+        '__init__': Session.__init__,
+        'from_dict': classmethod(Session.from_dict.__func__),
+        'to_dict': Session.to_dict
+    })
+
+    user_id = str(ObjectId())
+    documents = [{'_id': ObjectId(), **session} for session in synthetic_sessions(args.sessions, user_id, args.seed)]
+    with_ids = b''.join(bson.encode(document) for document in documents)
+    without_ids = b''.join(bson.encode({key: value for key, value in document.items() if key != '_id'})
+                           for document in documents)
+    raw = CodecOptions(document_class=RawBSONDocument)
+    del documents
+
+    paths = {
+        'objects (__dict__)': lambda: [PlainSession.from_dict(d).to_dict() for d in bson.decode_all(with_ids)],
+        'objects (__slots__)': lambda: [Session.from_dict(d).to_dict() for d in bson.decode_all(with_ids)],
+        'row copies (before)': lambda: [{f: d.get(f) for f in SESSION_FIELDS} for d in bson.decode_all(with_ids)],
+        'rows in place (now)': lambda: Session.to_rows(bson.decode_all(without_ids), SESSION_FIELDS),
+        'RawBSONDocument': lambda: [{f: d.get(f) for f in SESSION_FIELDS} for d in bson.decode_all(with_ids, raw)],
+    }
+    print(f'{args.sessions} sessions, {len(with_ids) / 1024 / 1024:.1f} MB of BSON')
+    print(f'  {"":22} {"rows":>9} {"+ JSON":>9} {"peak":>9}')
+    for name, build in paths.items():
+        seconds, peak = run(build, args.repeat)
+        with_json, _ = run(lambda: dumps_bytes(build()), args.repeat)
+        print(f'  {name:22} {seconds * 1000:>6.0f} ms {with_json * 1000:>6.0f} ms {peak:>6.1f} MB')
+
+    for name, cls in (('__dict__', PlainSession), ('__slots__', Session)):
+        decoded = bson.decode_all(with_ids)
+        gc.collect()
+        tracemalloc.start()
+        held = [cls.from_dict(d) for d in decoded]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f'  {len(held)} Session objects held ({name}): {size / 1024 / 1024:.1f} MB')
+        del held, decoded
+
+    if args.mongo_uri:
+        sessions_collection.database.client.drop_database(args.db_name)
+        sessions_collection.insert_many(synthetic_sessions(args.sessions, user_id, args.seed))
+        Session.ensure_indexes()
+        query = {'user_id': user_id, 'date': {'$gte': '2000-01-01', '$lte': '2099-12-31'}}
+
+        def before():
+            found = sessions_collection.find(query).sort('date', 1)
+            return [Session.from_dict(document).to_dict() for document in found]
+
+        def now():
+            return Session.get_date_range_page(user_id, '2000-01-01', '2099-12-31')[0]
+
+        for name, fetch in (('find + objects (before)', before), ('get_date_range_page (now)', now)):
+            seconds, peak = run(fetch, args.repeat)
+            print(f'  {name:26} {seconds * 1000:>6.0f} ms {peak:>6.1f} MB peak')
+        sessions_collection.database.client.drop_database(args.db_name)
+
+
+if __name__ == '__main__':
+    main()
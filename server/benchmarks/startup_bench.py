@@ -0,0 +1,134 @@
+"""
+Cold-start check for `import app`, based on `python -X importtime`.
+
+    python benchmarks/startup_bench.py [--runs 5] [--budget-ms 400] [--module app] [--compare <git ref> ...]
+
+Each run imports the module in a fresh interpreter. The script prints the
+median cumulative import time and the slowest imported packages, and exits
+with status 1 when the median is over the budget or when a module that
+should load lazily (the Gemini/ElevenLabs SDKs) was pulled in at startup.
+
+--compare extracts server/ at other commits into temporary directories and
+reports their import time and the threads left running after import (each
+MongoClient starts its own monitor threads) next to the current tree. To
+measure the shared MongoClient change, pass the commit that introduced
+database.get_client and its parent, e.g.
+
+    ref=$(git log --format=%h -S'def get_client' -- server/database.py | tail -1)
+    python benchmarks/startup_bench.py --compare "$ref^" "$ref"
+
+(one MongoClient per model before, one lazily created client after).
+"""
+import argparse
+import io
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only needed by /api/ai and /api/tts, so they must not be imported at startup
+LAZY_MODULES = ('google.genai', 'elevenlabs')
+# Older trees build the upstream clients at import time, which needs some key
+BENCH_ENV = {'GEMINI_KEY': 'startup-bench', 'ELEVEN_LABS': 'startup-bench', **os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def import_once(module, server_dir=SERVER_DIR):
+    """Return {module_name: cumulative_us} for top-level imports in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=server_dir,
+        capture_output=True,
+        text=True,
+        env=BENCH_ENV
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            timings[match.group(4)] = int(match.group(2))
+    return timings
+
+
+def eager_modules(timings):
+    """The LAZY_MODULES (or their submodules) that an import pulled in."""
+    return sorted(name for name in timings for lazy in LAZY_MODULES if name == lazy or name.startswith(lazy + '.'))
+
+
+def threads_after_import(module, server_dir):
+    result = subprocess.run(
+        [sys.executable, '-c', f'import threading, {module}; print(threading.active_count())'],
+        cwd=server_dir,
+        capture_output=True,
+        text=True,
+        env=BENCH_ENV
+    )
+    return int(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+
+
+def extract_tree(ref, directory):
+    """Write server/ as of git `ref` into `directory` and return it."""
+    archive = subprocess.run(
+        ['git', 'archive', '--format=tar', f'{ref}:server'],
+        cwd=os.path.dirname(SERVER_DIR),
+        capture_output=True,
+        check=True
+    )
+    with tarfile.open(fileobj=io.BytesIO(archive.stdout)) as tar:
+        tar.extractall(directory)
+    return directory
+
+
+def compare(module, refs, runs):
+    with tempfile.TemporaryDirectory() as directory:
+        trees = [('current', SERVER_DIR)]
+        for i, ref in enumerate(refs):
+            trees.append((ref, extract_tree(ref, os.path.join(directory, str(i)))))
+        print(f'{"tree":>12}  {"median import":>14}  {"threads after import":>20}')
+        for name, server_dir in trees:
+            median_ms = statistics.median(import_once(module, server_dir)[module] / 1000 for _ in range(runs))
+            print(f'{name:>12}  {median_ms:>11.1f} ms  {threads_after_import(module, server_dir)!s:>20}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=400)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--compare', metavar='REF', nargs='+', help='also time the import at these git commits')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.module, args.compare, args.runs)
+        return
+
+    runs = [import_once(args.module) for _ in range(args.runs)]
+    totals_ms = [timings[args.module] / 1000 for timings in runs]
+    median_ms = statistics.median(totals_ms)
+
+    print(f'import {args.module}: median {median_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)')
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)
+    for name, cumulative_us in [item for item in slowest if '.' not in item[0]][:args.top]:
+        print(f'  {cumulative_us / 1000:>8.1f} ms  {name}')
+
+    eager = eager_modules(runs[-1])
+    failed = False
+    if eager:
+        print(f'FAIL: imported at startup but should be lazy: {", ".join(eager)}')
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f'FAIL: startup over budget by {median_ms - args.budget_ms:.1f} ms')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Time to first audio byte for /api/tts, buffered vs streaming.
+
+    python benchmarks/tts_stream_bench.py [--chunks 20] [--chunk-delay-ms 50] [--chunk-kb 16] [--runs 5]
+
+ElevenLabs is replaced by a fake generator that sleeps --chunk-delay-ms before
+each of --chunks chunks, like a synthesis that produces audio gradually. The
+TTS cache is disabled so every request goes upstream. For each mode the script
+reports the median time until the client receives the first byte and until
+it has the whole body.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+class SlowTextToSpeech:
+    def __init__(self, chunks, delay, chunk_bytes):
+        self.chunks = chunks
+        self.delay = delay
+        self.chunk_bytes = chunk_bytes
+
+    def convert(self, text, **kwargs):
+        for _ in range(self.chunks):
+            time.sleep(self.delay)
+            yield os.urandom(self.chunk_bytes)
+
+    stream = convert
+
+
+class FakeElevenLabs:
+    def __init__(self, text_to_speech):
+        self.text_to_speech = text_to_speech
+
+
+def timed_request(client, stream, message):
+    """(seconds to first body byte, seconds to full body, body bytes)."""
+    start = time.perf_counter()
+    response = client.post('/api/tts', json={'message': message, 'stream': stream}, buffered=False)
+    first = None
+    size = 0
+    for chunk in response.response:
+        if chunk and first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    response.close()
+    if response.status_code != 200:
+        raise RuntimeError(f'/api/tts answered {response.status_code}')
+    return first, time.perf_counter() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=20)
+    parser.add_argument('--chunk-delay-ms', type=float, default=50)
+    parser.add_argument('--chunk-kb', type=int, default=16)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['ELEVEN_LABS'] = 'benchmark'
+    os.environ['TTS_CACHE_MAX_BYTES'] = '0'
+    os.environ['RATE_LIMIT_BACKEND'] = 'none'
+
+    import upstream
+    import app as app_module
+    upstream._clients['elevenlabs'] = FakeElevenLabs(
+        SlowTextToSpeech(args.chunks, args.chunk_delay_ms / 1000, args.chunk_kb * 1024))
+    client = app_module.app.test_client()
+
+    print(f'{args.chunks} chunks of {args.chunk_kb} KB, {args.chunk_delay_ms:.0f} ms apart '
+          f'(~{args.chunks * args.chunk_delay_ms:.0f} ms of synthesis)')
+    for name, stream in (('buffered', False), ('streaming', True)):
+        runs = [timed_request(client, stream, f'benchmark {name} {i}') for i in range(args.runs)]
+        first = statistics.median(run[0] for run in runs) * 1000
+        total = statistics.median(run[1] for run in runs) * 1000
+        print(f'  {name:>10}: first byte {first:>7.1f} ms   full body {total:>7.1f} ms   {runs[0][2] // 1024} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Cost of resolving a bearer token to a user, with and without the auth caches.
+
+    python benchmarks/verify_token_bench.py [--users 1000] [--checks 20000] [--mongo-uri mongodb://localhost:27017]
+
+Tokens for --users users are checked --checks times in random order through
+auth.authenticate, which every protected route calls:
+
+- uncached: AuthToken.decode_token (JWT signature check) plus User.find_by_id,
+  the path before the token and public data caches
+- cached: verify_token_cached + User.get_public_data with warm caches,
+  including the periodic sync that evicts users updated by other workers
+  (--sync-seconds, forced on every check with 0)
+
+By default the users live in mongomock, so the uncached column understates a
+real round trip; pass --mongo-uri to measure against a mongod.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    pick = lambda q: timings[min(len(timings) - 1, int(q * len(timings)))] * 1e6
+    return f'p50 {pick(0.5):>7.1f} us   p99 {pick(0.99):>7.1f} us   {len(timings) / sum(timings):>9.0f}/s'
+
+
+def timed(fn, tokens):
+    timings = []
+    for token in tokens:
+        start = time.perf_counter()
+        if fn(token) is None:
+            raise RuntimeError('token did not resolve to a user')
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--checks', type=int, default=20000)
+    parser.add_argument('--sync-seconds', type=float, default=5)
+    parser.add_argument('--mongo-uri', help='store the users in a real mongod instead of mongomock')
+    parser.add_argument('--db-name', default='lockin_auth_benchmark')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ['MONGO_DB_NAME'] = args.db_name
+    os.environ['AUTH_CACHE_SYNC_SECONDS'] = str(args.sync_seconds)
+    os.environ['AUTH_CACHE_MAX_ENTRIES'] = str(max(args.users, 1))
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+    else:
+        import mongomock
+        import database
+        database.MongoClient = mongomock.MongoClient
+
+    from auth import authenticate, token_cache
+    from models.AuthToken import AuthToken
+    from models.User import User, public_data_cache, users_collection
+
+    users_collection.database.client.drop_database(args.db_name)
+    User.ensure_indexes()
+    result = users_collection.insert_many([
+        {'username': f'user_{i}', 'email': f'user_{i}@example.com', 'password_hash': 'unused'}
+        for i in range(args.users)
+    ])
+    tokens = [AuthToken.generate_token(user_id) for user_id in result.inserted_ids]
+    rng = random.Random(args.seed)
+    checks = [rng.choice(tokens) for _ in range(args.checks)]
+
+    def uncached(token):
+        user_id = AuthToken.verify_token(token)
+        user = User.find_by_id(user_id) if user_id else None
+        return user.public_data() if user else None
+
+    def cached(token):
+        return authenticate(token)[0]
+
+    token_cache.clear()
+    public_data_cache.clear()
+    for token in tokens:
+        cached(token)
+
+    print(f'{args.users} users, {args.checks} checks, {"mongod" if args.mongo_uri else "mongomock"}')
+    print(f'  {"uncached (decode + find_by_id)":30} {percentiles(timed(uncached, checks))}')
+    print(f'  {f"cached (sync every {args.sync_seconds:g} s)":30} {percentiles(timed(cached, checks))}')
+    if args.mongo_uri:
+        users_collection.database.client.drop_database(args.db_name)
+
+
+if __name__ == '__main__':
+    main()
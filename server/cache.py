@@ -0,0 +1,221 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+from database import get_collection
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'backend': 'memory',
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class MongoCache:
+    """Cache shared between workers, stored in a Mongo collection.
+
+    Expiry is handled by a TTL index on `expires_at`; the size bound evicts the
+    least recently used entries.
+    """
+
+    def __init__(self, collection_name, max_entries=10000, ttl=3600):
+        self.collection = get_collection(collection_name)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def ensure_indexes(self):
+        self.collection.create_index([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0)
+        self.collection.create_index([('last_used', ASCENDING)], name='last_used')
+
+    def get(self, key):
+        now = datetime.utcnow()
+        entry = self.collection.find_one_and_update(
+            {'_id': key, 'expires_at': {'$gt': now}},
+            {'$set': {'last_used': now}}
+        )
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['value']
+
+    def set(self, key, value):
+        now = datetime.utcnow()
+        self.collection.update_one(
+            {'_id': key},
+            {'$set': {'value': value, 'last_used': now, 'expires_at': now + timedelta(seconds=self.ttl)}},
+            upsert=True
+        )
+        overflow = self.collection.estimated_document_count() - self.max_entries
+        if overflow > 0:
+            stale = self.collection.find({}, {'_id': 1}).sort('last_used', ASCENDING).limit(overflow)
+            self.collection.delete_many({'_id': {'$in': [entry['_id'] for entry in stale]}})
+
+    def delete(self, key):
+        self.collection.delete_one({'_id': key})
+
+    def clear(self):
+        self.collection.delete_many({})
+
+    def stats(self):
+        return {
+            'backend': 'mongo',
+            'size': self.collection.estimated_document_count(),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class DiskCache:
+    """Content-addressed files in a directory, trimmed to `max_bytes` by least recent use.
+
+    Recency is the file mtime and the budget is enforced from a scan of the
+    directory, so several workers can share one directory (each trims files the
+    others wrote) and the order survives restarts.
+    """
+
+    def __init__(self, directory, max_bytes, suffix=''):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._files = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.trim()
+
+    @property
+    def total_bytes(self):
+        """Directory size as of the last scan."""
+        return self._bytes
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get_path(self, key):
+        """Return the cached file path for `key`, or None on a miss."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Never cached, or evicted by another worker
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, key, data):
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+        # Puts follow an upstream synthesis, so a scan per put is cheap by comparison
+        self.trim()
+        return path
+
+    def trim(self):
+        """Scan the directory and remove the least recently used files while it is over budget."""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(self.suffix) or entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        if total > self.max_bytes:
+            files.sort()
+            # Always keep the newest file, even if it alone is over budget
+            while total > self.max_bytes and len(files) > 1:
+                _, size, path = files.pop(0)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        with self._lock:
+            self._files = len(files)
+            self._bytes = total
+
+    def stats(self):
+        return {
+            'backend': 'disk',
+            'size': self._files,
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+def make_cache(backend, collection_name, max_entries, ttl):
+    """Build a cache for the configured backend ('memory', 'mongo' or 'none')."""
+    if backend == 'none':
+        return None
+    if backend == 'mongo':
+        return MongoCache(collection_name, max_entries=max_entries, ttl=ttl)
+    return TTLCache(max_entries=max_entries, ttl=ttl)
+
+
+def normalize_prompt(message):
+    """Collapse case, whitespace and trailing punctuation so repeat questions share a key."""
+    return ' '.join(message.lower().split()).rstrip('?!. ')
+
+
+def hash_key(*parts):
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
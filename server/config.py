@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,4 +8,79 @@ class Config:
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/auth_db')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
     JWT_ALGORITHM = 'HS256'
-    JWT_EXPIRATION_HOURS = 24
\ No newline at end of file
+    JWT_EXPIRATION_HOURS = 24
+    GEMINI_API_KEY = os.getenv('GEMINI_KEY')
+    ELEVEN_LABS_API_KEY = os.getenv('ELEVEN_LABS')
+    # bcrypt work factor; hashes with a different cost are upgraded on the next login
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    # Hashing runs on a small pool so login bursts can't take every worker thread
+    BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', os.cpu_count() or 2))
+    BCRYPT_MAX_QUEUED = int(os.getenv('BCRYPT_MAX_QUEUED', 64))
+    BCRYPT_QUEUE_TIMEOUT_SECONDS = float(os.getenv('BCRYPT_QUEUE_TIMEOUT_SECONDS', 5))
+    # Verified tokens and public user data are cached briefly to spare repeat checks
+    AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', 10000))
+    AUTH_CACHE_TTL_SECONDS = int(os.getenv('AUTH_CACHE_TTL_SECONDS', 300))
+    # Other workers drop cached user data within this long of a user update
+    AUTH_CACHE_SYNC_SECONDS = float(os.getenv('AUTH_CACHE_SYNC_SECONDS', 5))
+
+    # MongoDB client (shared by every model, see database.py)
+    MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'level_up')
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 30000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000))
+    # Comma separated, e.g. "zstd,snappy" (needs the zstandard / python-snappy packages)
+    MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', '')
+
+    # Cache for /api/ai answers: 'memory' (per process), 'mongo' (shared) or 'none'
+    AI_CACHE_BACKEND = os.getenv('AI_CACHE_BACKEND', 'memory')
+    AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 1024))
+    AI_CACHE_TTL_SECONDS = int(os.getenv('AI_CACHE_TTL_SECONDS', 24 * 3600))
+
+    # On-disk cache of synthesized /api/tts audio; set TTS_CACHE_MAX_BYTES=0 to disable
+    TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'lockin-tts-cache'))
+    TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Upper bound on audio forwarded by a streaming /api/tts response
+    TTS_STREAM_MAX_BYTES = int(os.getenv('TTS_STREAM_MAX_BYTES', 10 * 1024 * 1024))
+
+    # Largest list accepted by /api/create-sessions
+    SESSION_BATCH_MAX = int(os.getenv('SESSION_BATCH_MAX', 500))
+    # Largest page size for the session listing endpoints
+    SESSION_PAGE_MAX = int(os.getenv('SESSION_PAGE_MAX', 100))
+    # 'documents' (one per session) or 'buckets' (one per user and month, see
+    # models/SessionBucket.py); run `flask migrate-session-buckets` before switching
+    SESSION_STORAGE = os.getenv('SESSION_STORAGE', 'documents')
+    # 'sync' writes /api/create-session in the request; 'queue' stages it and
+    # answers 202, leaving the write to background workers (see session_queue.py)
+    SESSION_INGEST_MODE = os.getenv('SESSION_INGEST_MODE', 'sync')
+    SESSION_QUEUE_BATCH_SIZE = int(os.getenv('SESSION_QUEUE_BATCH_SIZE', 200))
+    SESSION_QUEUE_WORKERS = int(os.getenv('SESSION_QUEUE_WORKERS', 1))
+    SESSION_QUEUE_POLL_SECONDS = float(os.getenv('SESSION_QUEUE_POLL_SECONDS', 0.5))
+    # A batch not finished within this long is handed to another worker
+    SESSION_QUEUE_LEASE_SECONDS = int(os.getenv('SESSION_QUEUE_LEASE_SECONDS', 60))
+    # After this many claims an entry is marked failed and kept for inspection
+    SESSION_QUEUE_MAX_ATTEMPTS = int(os.getenv('SESSION_QUEUE_MAX_ATTEMPTS', 5))
+
+    # Admission control for /api/ai, /api/tts and /api/ai-speech (see admission.py).
+    # Buckets are 'memory' (per process), 'mongo' (shared by all workers) or 'none'
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_USER_PER_MINUTE = float(os.getenv('RATE_LIMIT_USER_PER_MINUTE', 20))
+    RATE_LIMIT_USER_BURST = int(os.getenv('RATE_LIMIT_USER_BURST', 5))
+    RATE_LIMIT_IP_PER_MINUTE = float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', 60))
+    RATE_LIMIT_IP_BURST = int(os.getenv('RATE_LIMIT_IP_BURST', 10))
+    # Only honour X-Forwarded-For when running behind a proxy that sets it
+    TRUST_PROXY_HEADERS = os.getenv('TRUST_PROXY_HEADERS', '').lower() in ('1', 'true', 'yes')
+    # Upstream calls allowed in flight per process; more are answered with 429
+    UPSTREAM_MAX_CONCURRENCY = int(os.getenv('UPSTREAM_MAX_CONCURRENCY', 16))
+    # Identical concurrent prompts share one upstream call: 'memory' or 'mongo'
+    SINGLE_FLIGHT_BACKEND = os.getenv('SINGLE_FLIGHT_BACKEND', 'memory')
+    SINGLE_FLIGHT_TIMEOUT_SECONDS = float(os.getenv('SINGLE_FLIGHT_TIMEOUT_SECONDS', 30))
+
+    # How stale /api/leaderboard and /api/rank may get before syncing changed records
+    LEADERBOARD_REFRESH_SECONDS = float(os.getenv('LEADERBOARD_REFRESH_SECONDS', 5))
+    LEADERBOARD_PAGE_MAX = int(os.getenv('LEADERBOARD_PAGE_MAX', 100))
+
+    # Requests sent with "X-Profile: 1" are run under cProfile when enabled
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'lockin-profiles'))
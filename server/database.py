@@ -0,0 +1,58 @@
+import os
+import threading
+from pymongo import MongoClient
+from config import Config
+from metrics import mongo_command_listener
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def _client_options():
+    options = {
+        'maxPoolSize': Config.MONGO_MAX_POOL_SIZE,
+        'minPoolSize': Config.MONGO_MIN_POOL_SIZE,
+        'serverSelectionTimeoutMS': Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'connectTimeoutMS': Config.MONGO_CONNECT_TIMEOUT_MS,
+        'socketTimeoutMS': Config.MONGO_SOCKET_TIMEOUT_MS,
+        # Don't start monitor threads until the first operation
+        'connect': False,
+        'event_listeners': [mongo_command_listener]
+    }
+    if Config.MONGO_COMPRESSORS:
+        options['compressors'] = Config.MONGO_COMPRESSORS
+    return options
+
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use.
+
+    The client is rebuilt after a fork, since PyMongo clients are not fork-safe.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = MongoClient(Config.MONGO_URI, **_client_options())
+                _client_pid = pid
+    return _client
+
+
+def get_db():
+    return get_client().get_database(Config.MONGO_DB_NAME)
+
+
+class LazyCollection:
+    """Stand-in for a pymongo Collection that resolves the shared client on access."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+
+def get_collection(name):
+    return LazyCollection(name)
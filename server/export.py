@@ -0,0 +1,122 @@
+"""
+Session export formats, all fed from a Mongo cursor so memory stays flat.
+
+NDJSON and CSV are produced as chunk generators that can go straight into a
+streaming Flask response or to a file. Parquet and Arrow IPC files are
+written in record batches by pyarrow, which is only needed for those
+formats (pip install pyarrow).
+"""
+import csv
+import io
+from json_provider import dumps
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+FILE_FORMATS = EXPORT_FORMATS + ('parquet', 'arrow')
+STRING_FIELDS = {'session_id', 'user_id', 'username', 'date', 'time_started'}
+# Rows per yielded text chunk, and per Parquet row group / Arrow record batch
+CHUNK_ROWS = 500
+BATCH_ROWS = 10000
+
+
+def export_rows(documents, fields):
+    """Session documents -> flat dicts with a leading session_id column."""
+    for document in documents:
+        row = {'session_id': str(document['_id'])}
+        for field in fields:
+            row[field] = document.get(field)
+        yield row
+
+
+def ndjson_chunks(rows):
+    lines = []
+    for row in rows:
+        lines.append(dumps(row))
+        if len(lines) == CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def csv_chunks(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def chunks(rows, columns, export_format):
+    if export_format == 'csv':
+        return csv_chunks(rows, columns)
+    return ndjson_chunks(rows)
+
+
+def write_file(rows, columns, path, export_format):
+    """Write rows to `path` in any of FILE_FORMATS; returns the row count."""
+    if export_format in ('parquet', 'arrow'):
+        return write_arrow(rows, columns, path, export_format)
+
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with open(path, 'w', newline='') as f:
+        for chunk in chunks(counted(), columns, export_format):
+            f.write(chunk)
+    return count
+
+
+def write_arrow(rows, columns, path, export_format):
+    """Write rows to a Parquet or Arrow IPC file one record batch at a time; returns the row count."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError(f"{export_format} export needs pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        (column, pa.string() if column in STRING_FIELDS else pa.float64())
+        for column in columns
+    ])
+
+    def to_table(batch_rows):
+        arrays = []
+        for field in schema:
+            values = [row.get(field.name) for row in batch_rows]
+            if pa.types.is_string(field.type):
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(path, schema)
+    else:
+        writer = pa.ipc.new_file(path, schema)
+
+    total = 0
+    batch_rows = []
+    try:
+        for row in rows:
+            batch_rows.append(row)
+            if len(batch_rows) == BATCH_ROWS:
+                writer.write_table(to_table(batch_rows))
+                total += len(batch_rows)
+                batch_rows = []
+        if batch_rows:
+            writer.write_table(to_table(batch_rows))
+            total += len(batch_rows)
+    finally:
+        writer.close()
+    return total
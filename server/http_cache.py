@@ -0,0 +1,32 @@
+from functools import wraps
+from flask import make_response, request
+
+# Per-user data: browsers may keep it but must revalidate, shared caches must not store it
+CACHE_CONTROL = 'private, no-cache'
+
+
+def conditional(etag_for):
+    """Answer If-None-Match with 304 before the view builds its payload.
+
+    `etag_for` gets the view's URL arguments and returns the current strong
+    ETag value (unquoted), or None when no tag applies. The tag is also set on
+    successful responses, together with Cache-Control.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            etag = etag_for(**kwargs)
+            if etag is None:
+                return f(*args, **kwargs)
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            return response
+        return decorated
+    return decorator
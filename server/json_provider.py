@@ -0,0 +1,68 @@
+"""
+JSON provider for Flask that serializes with orjson when it is installed and
+falls back to the stdlib json module otherwise.
+
+Both paths understand ObjectId (as its hex string) and datetime/date (as ISO
+8601), so models can hand raw Mongo values to jsonify/create_response.
+"""
+import json
+from datetime import date, datetime
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+    def dumps(obj):
+        return dumps_bytes(obj).decode('utf-8')
+
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps_bytes(obj):
+        return dumps(obj).encode('utf-8')
+
+    loads = json.loads
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+class FastJSONProvider(JSONProvider):
+    """Drop-in for Flask's DefaultJSONProvider: `app.json = FastJSONProvider(app)`."""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Callers asking for indent/sort_keys etc. get the stdlib path
+            kwargs.setdefault('default', _default)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,289 @@
+"""
+Leaderboards and percentile ranks over user Records.
+
+Each process keeps, per metric, an order-statistic list of (-score, user_id).
+All boards are built from one scan of `records` in a background thread,
+started at server startup or by the first leaderboard request; until it
+finishes, lookups raise LeaderboardWarming (served as 503). After that the
+boards are synced from the records changed since the last sync
+(Record.updated_at), at most once every Config.LEADERBOARD_REFRESH_SECONDS.
+Rank, percentile and page lookups take O(log n) plus one block bisect, so no
+request scans or sorts the users.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from config import Config
+from models.Record import Record
+
+
+def focus_rate(record):
+    """Share of logged hours that were neither unfocused nor paused."""
+    if not record.get('total_hours'):
+        return None
+    lost = (record.get('time_unfocused') or 0) + (record.get('time_paused') or 0)
+    return max(0.0, 1 - lost / record['total_hours'])
+
+
+def habit_free_rate(record):
+    """Share of logged hours without hair, nail, eye or nose touching."""
+    if not record.get('total_hours'):
+        return None
+    habits = sum(record.get(field) or 0 for field in ('time_hair', 'time_nail', 'time_eye', 'time_nose'))
+    return max(0.0, 1 - habits / record['total_hours'])
+
+
+# metric name -> score for a record dict (higher is better; None leaves the user off that board)
+METRICS = {
+    'hours': lambda record: record.get('total_hours') or 0,
+    'sessions': lambda record: record.get('total_sessions') or 0,
+    'focus': focus_rate,
+    'habits': habit_free_rate
+}
+
+
+class RankedList:
+    """Sorted multiset split into blocks, with a Fenwick tree over the block sizes.
+
+    Gives index-of-item and item-at-index in O(log n) plus a bisect inside one
+    block, and inserts/removes without shifting the whole list.
+    """
+
+    def __init__(self, items=(), block_size=512):
+        self.block_size = block_size
+        items = sorted(items)
+        self._blocks = [items[i:i + block_size] for i in range(0, len(items), block_size)]
+        self._rebuild()
+
+    def _rebuild(self):
+        self._maxes = [block[-1] for block in self._blocks]
+        self._tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks):
+            self._tree_add(i, len(block))
+        self._len = sum(len(block) for block in self._blocks)
+
+    def _tree_add(self, index, delta):
+        index += 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _tree_prefix(self, index):
+        """Number of items in blocks before `index`."""
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _tree_find(self, position):
+        """(block, offset) holding the item at `position`."""
+        block = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            candidate = block + step
+            if candidate < len(self._tree) and self._tree[candidate] <= position:
+                block = candidate
+                position -= self._tree[candidate]
+            step >>= 1
+        return block, position
+
+    def __len__(self):
+        return self._len
+
+    def add(self, item):
+        if not self._blocks:
+            self._blocks.append([item])
+            self._rebuild()
+            return
+        i = min(bisect_left(self._maxes, item), len(self._blocks) - 1)
+        block = self._blocks[i]
+        insort(block, item)
+        self._maxes[i] = block[-1]
+        self._len += 1
+        if len(block) > 2 * self.block_size:
+            self._blocks[i:i + 1] = [block[:self.block_size], block[self.block_size:]]
+            self._rebuild()
+        else:
+            self._tree_add(i, 1)
+
+    def remove(self, item):
+        i = bisect_left(self._maxes, item)
+        if i == len(self._blocks):
+            raise ValueError(f'{item!r} not in list')
+        block = self._blocks[i]
+        j = bisect_left(block, item)
+        if j == len(block) or block[j] != item:
+            raise ValueError(f'{item!r} not in list')
+        del block[j]
+        self._len -= 1
+        if not block:
+            del self._blocks[i]
+            self._rebuild()
+        else:
+            self._maxes[i] = block[-1]
+            self._tree_add(i, -1)
+
+    def index(self, item):
+        """Number of items smaller than `item`."""
+        i = bisect_left(self._maxes, item)
+        if i == len(self._blocks):
+            return self._len
+        return self._tree_prefix(i) + bisect_left(self._blocks[i], item)
+
+    def slice(self, start, count):
+        items = []
+        if start >= self._len:
+            return items
+        i, j = self._tree_find(start)
+        while i < len(self._blocks) and len(items) < count:
+            items.extend(self._blocks[i][j:j + count - len(items)])
+            i, j = i + 1, 0
+        return items
+
+
+class LeaderboardWarming(Exception):
+    """The boards are still being built; try again shortly."""
+
+
+class Leaderboard:
+    def __init__(self, refresh_seconds=5):
+        self.refresh_seconds = refresh_seconds
+        self._boards = {}
+        # user_id -> (username, {metric: score})
+        self._users = {}
+        self._synced_at = None
+        self._checked = 0.0
+        self._lock = threading.RLock()
+        self._warming_pid = None
+        self._warm_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._synced_at is not None
+
+    def _put(self, record):
+        user_id = str(record['user_id'])
+        username, old_scores = self._users.get(user_id, (None, {}))
+        scores = {}
+        for metric, board in self._boards.items():
+            score = METRICS[metric](record)
+            old = old_scores.get(metric)
+            if old is not None:
+                board.remove((-old, user_id))
+            if score is not None:
+                board.add((-score, user_id))
+                scores[metric] = score
+        self._users[user_id] = (record.get('username') or username, scores)
+
+    def warm(self):
+        """Build every board from one scan of the records.
+
+        The scan runs without the lock; records that change during it are
+        folded in by the refresh that follows.
+        """
+        started = datetime.utcnow()
+        items = {metric: [] for metric in METRICS}
+        users = {}
+        for record in Record.iter_for_ranking():
+            user_id = str(record['user_id'])
+            scores = {}
+            for metric, score_of in METRICS.items():
+                score = score_of(record)
+                if score is not None:
+                    items[metric].append((-score, user_id))
+                    scores[metric] = score
+            users[user_id] = (record.get('username'), scores)
+        boards = {metric: RankedList(metric_items) for metric, metric_items in items.items()}
+        with self._lock:
+            self._boards = boards
+            self._users = users
+            self._synced_at = started
+        self.refresh(force=True)
+
+    def _warm_in_background(self):
+        try:
+            self.warm()
+        except Exception as e:
+            print(f"Leaderboard warm-up failed: {e}")
+            # Let the next request start another attempt
+            self._warming_pid = None
+
+    def ensure_warming(self):
+        """Start building the boards in a background thread, once per process (again after a fork)."""
+        if self.ready or self._warming_pid == os.getpid():
+            return
+        with self._warm_lock:
+            if self.ready or self._warming_pid == os.getpid():
+                return
+            self._warming_pid = os.getpid()
+            threading.Thread(target=self._warm_in_background, name='leaderboard-warm', daemon=True).start()
+
+    def refresh(self, force=False):
+        """Fold in records changed since the last sync."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_seconds:
+            return
+        with self._lock:
+            if not self.ready:
+                return
+            self._checked = now
+            started = datetime.utcnow()
+            # Overlap a little; re-applying a record is harmless
+            for record in Record.iter_for_ranking(changed_since=self._synced_at - timedelta(seconds=1)):
+                self._put(record)
+            self._synced_at = started
+
+    def board(self, metric):
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of: {', '.join(METRICS)}")
+        if not self.ready:
+            self.ensure_warming()
+            raise LeaderboardWarming()
+        self.refresh()
+        return self._boards[metric]
+
+    def top(self, metric, offset=0, limit=20):
+        """Returns (entries, total)."""
+        board = self.board(metric)
+        with self._lock:
+            items = board.slice(offset, limit)
+            entries = []
+            for position, (negative_score, user_id) in enumerate(items):
+                entries.append({
+                    # Users with equal scores share a rank
+                    'rank': board.index((negative_score, '')) + 1,
+                    'position': offset + position + 1,
+                    'user_id': user_id,
+                    'username': self._users[user_id][0],
+                    'score': round(-negative_score, 4)
+                })
+            return entries, len(board)
+
+    def rank(self, metric, user_id):
+        """Rank and percentile of one user, or None if they aren't on the board."""
+        board = self.board(metric)
+        user_id = str(user_id)
+        with self._lock:
+            username, scores = self._users.get(user_id, (None, {}))
+            if metric not in scores:
+                return None
+            score = scores[metric]
+            total = len(board)
+            ahead = board.index((-score, ''))
+            not_behind = board.index((-score, '\U0010ffff'))
+            behind = total - not_behind
+            return {
+                'user_id': user_id,
+                'username': username,
+                'score': round(score, 4),
+                'rank': ahead + 1,
+                'total': total,
+                # Share of other users this user is ahead of
+                'percentile': round(100 * behind / (total - 1), 2) if total > 1 else 100.0
+            }
+
+
+leaderboard = Leaderboard(refresh_seconds=Config.LEADERBOARD_REFRESH_SECONDS)
@@ -0,0 +1,162 @@
+"""
+In-process metrics exported in the Prometheus text format at /metrics.
+
+Tracks per-endpoint request latency, MongoDB command latency (via a PyMongo
+CommandListener) and upstream Gemini/ElevenLabs call latency. Setting
+PROFILING_ENABLED=1 also lets a request carrying `X-Profile: 1` be run under
+cProfile, with the stats written to Config.PROFILE_DIR.
+"""
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, g, request
+from pymongo import monitoring
+from config import Config
+
+# Seconds; wide enough for sub-millisecond Mongo reads and multi-second LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    body = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels)
+    return '{' + body + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = list(zip(self.label_names, key))
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", bound)])} {count}')
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", "+Inf")])} {series["count"]}')
+                lines.append(f'{self.name}_sum{_format_labels(labels)} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{_format_labels(labels)} {series["count"]}')
+        return lines
+
+
+request_latency = Histogram(
+    'lockin_http_request_duration_seconds',
+    'Time spent handling an HTTP request (until the response starts).',
+    ('endpoint', 'method', 'status')
+)
+mongo_latency = Histogram(
+    'lockin_mongo_command_duration_seconds',
+    'MongoDB command round trip time.',
+    ('command', 'outcome')
+)
+upstream_latency = Histogram(
+    'lockin_upstream_duration_seconds',
+    'Latency of calls to external APIs (Gemini, ElevenLabs).',
+    ('service', 'operation', 'outcome')
+)
+
+# Callables returning [(metric_name, {label: value}, number), ...], exported as gauges
+_collectors = []
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_latency.observe(event.duration_micros / 1e6, command=event.command_name, outcome='success')
+
+    def failed(self, event):
+        mongo_latency.observe(event.duration_micros / 1e6, command=event.command_name, outcome='failure')
+
+
+mongo_command_listener = MongoCommandTimer()
+
+
+@contextmanager
+def time_upstream(service, operation):
+    """Time a block calling an external API, e.g. `with time_upstream('gemini', 'generate_content'):`."""
+    start = time.perf_counter()
+    outcome = 'failure'
+    try:
+        yield
+        outcome = 'success'
+    finally:
+        upstream_latency.observe(time.perf_counter() - start, service=service, operation=operation, outcome=outcome)
+
+
+def render():
+    lines = []
+    for histogram in (request_latency, mongo_latency, upstream_latency):
+        lines.extend(histogram.render())
+
+    gauges = {}
+    for collector in _collectors:
+        for name, labels, value in collector():
+            gauges.setdefault(name, []).append((labels, value))
+    for name, samples in gauges.items():
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in samples:
+            lines.append(f'{name}{_format_labels(sorted(labels.items()))} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Install the timing hooks and the /metrics endpoint on a Flask app."""
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        if Config.PROFILING_ENABLED and request.headers.get('X-Profile') == '1':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def record_request(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+            filename = f"{request.endpoint or 'unmatched'}-{int(time.time() * 1000)}.prof"
+            profiler.dump_stats(os.path.join(Config.PROFILE_DIR, filename))
+            response.headers['X-Profile-File'] = filename
+
+        started = g.pop('request_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            request_latency.observe(
+                time.perf_counter() - started,
+                endpoint=endpoint,
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+    @app.get('/metrics')
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -14,11 +14,15 @@ class AuthToken:
         return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm=Config.JWT_ALGORITHM)
 
     @staticmethod
-    def verify_token(token):
+    def decode_token(token):
         try:
-            payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])
-            return payload['user_id']
+            return jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def verify_token(token):
+        payload = AuthToken.decode_token(token)
+        return payload['user_id'] if payload else None
\ No newline at end of file
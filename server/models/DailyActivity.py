@@ -0,0 +1,159 @@
+from pymongo import UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError
+from database import get_collection
+from datetime import datetime, timedelta
+from models.Session import Session, APPLIED_SESSIONS_KEPT
+
+daily_activity_collection = get_collection('daily_activity')
+
+# Per-day totals kept for each user; habit times are stored in seconds like sessions
+ACTIVITY_FIELDS = [
+    'total_hours', 'intervals', 'time_hair', 'time_nail',
+    'time_eye', 'time_nose', 'time_unfocused', 'time_paused'
+]
+
+
+class DailyActivity:
+    __slots__ = ('user_id', 'date', 'sessions', *ACTIVITY_FIELDS, '_id')
+
+    def __init__(self, user_id, date, sessions=0, total_hours=0, intervals=0, time_hair=0, time_nail=0, time_eye=0, time_nose=0, time_unfocused=0, time_paused=0, _id=None):
+        self.user_id = user_id
+        self.date = date
+        self.sessions = sessions
+        self.total_hours = total_hours
+        self.intervals = intervals
+        self.time_hair = time_hair
+        self.time_nail = time_nail
+        self.time_eye = time_eye
+        self.time_nose = time_nose
+        self.time_unfocused = time_unfocused
+        self.time_paused = time_paused
+        self._id = _id
+
+    @staticmethod
+    def ensure_indexes():
+        daily_activity_collection.create_index(
+            [('user_id', ASCENDING), ('date', ASCENDING)],
+            name='user_id_date_unique',
+            unique=True
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            user_id=data.get('user_id'),
+            date=data.get('date'),
+            sessions=data.get('sessions', 0),
+            total_hours=data.get('total_hours', 0),
+            intervals=data.get('intervals', 0),
+            time_hair=data.get('time_hair', 0),
+            time_nail=data.get('time_nail', 0),
+            time_eye=data.get('time_eye', 0),
+            time_nose=data.get('time_nose', 0),
+            time_unfocused=data.get('time_unfocused', 0),
+            time_paused=data.get('time_paused', 0),
+            _id=data.get('_id')
+        )
+
+    def to_dict(self):
+        return {
+            'date': self.date,
+            'sessions': self.sessions,
+            'total_hours': round(self.total_hours, 2),
+            'intervals': self.intervals,
+            'time_hair': self.time_hair,
+            'time_nail': self.time_nail,
+            'time_eye': self.time_eye,
+            'time_nose': self.time_nose,
+            'time_unfocused': self.time_unfocused,
+            'time_paused': self.time_paused
+        }
+
+    @staticmethod
+    def _increments(data):
+        increments = {'sessions': 1}
+        for field in ACTIVITY_FIELDS:
+            increments[field] = data.get(field) or 0
+        return increments
+
+    @classmethod
+    def add_session(cls, session_data):
+        """Fold one session into the user's rollup for that day."""
+        daily_activity_collection.update_one(
+            {'user_id': session_data['user_id'], 'date': session_data['date']},
+            {'$inc': cls._increments(session_data)},
+            upsert=True
+        )
+
+    @classmethod
+    def add_sessions(cls, sessions, retry=False):
+        """Fold many sessions into the rollups with one grouped $inc per user and day.
+
+        Sessions that carry an _id are added to the day's `applied_sessions`; with
+        retry=True each session is folded on its own unless the day already lists
+        it, like Record.increment_for_sessions.
+        """
+        totals = {}
+        session_ids = {}
+        for session in sessions:
+            key = (session['user_id'], session['date'], session['_id'] if retry else None)
+            day_totals = totals.setdefault(key, dict.fromkeys(['sessions'] + ACTIVITY_FIELDS, 0))
+            for field, value in cls._increments(session).items():
+                day_totals[field] += value
+            if session.get('_id'):
+                session_ids.setdefault(key, []).append(session['_id'])
+
+        operations = []
+        for key, day_totals in totals.items():
+            user_id, date, session_id = key
+            filter = {'user_id': user_id, 'date': date}
+            update = {'$inc': day_totals}
+            if key in session_ids:
+                update['$push'] = {'applied_sessions': {'$each': session_ids[key], '$slice': -APPLIED_SESSIONS_KEPT}}
+            if retry:
+                filter['applied_sessions'] = {'$ne': session_id}
+            operations.append(UpdateOne(filter, update, upsert=True))
+        if operations:
+            try:
+                daily_activity_collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                if not retry or any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                    raise
+        return len(operations)
+
+    @classmethod
+    def get_activity(cls, user_id, end_date, days=365):
+        """Return one entry per day for the `days` days ending on `end_date`, oldest first."""
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        start_date = (end - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        query = {
+            'user_id': user_id,
+            'date': {'$gte': start_date, '$lte': end_date}
+        }
+        by_date = {doc['date']: cls.from_dict(doc) for doc in daily_activity_collection.find(query, {'applied_sessions': 0})}
+
+        activity = []
+        for offset in range(days - 1, -1, -1):
+            date = (end - timedelta(days=offset)).strftime('%Y-%m-%d')
+            activity.append(by_date.get(date) or cls(user_id=user_id, date=date))
+        return activity
+
+    @classmethod
+    def rebuild_for_user(cls, user_id):
+        """Recompute a user's rollups from their raw sessions (backfill / repair)."""
+        group = {'_id': '$date', 'sessions': {'$sum': 1}}
+        for field in ACTIVITY_FIELDS:
+            group[field] = {'$sum': f'${field}'}
+        rows = Session.aggregate(Session.match_stages({'user_id': user_id}) + [{'$group': group}])
+
+        operations = []
+        for row in rows:
+            totals = {key: value for key, value in row.items() if key != '_id'}
+            operations.append(UpdateOne(
+                {'user_id': user_id, 'date': row['_id']},
+                {'$set': totals},
+                upsert=True
+            ))
+        if operations:
+            daily_activity_collection.bulk_write(operations, ordered=False)
+        return len(operations)
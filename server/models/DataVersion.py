@@ -0,0 +1,39 @@
+from pymongo import UpdateOne
+from database import get_collection
+from datetime import datetime
+
+data_versions_collection = get_collection('data_versions')
+
+
+class DataVersion:
+    """Per-user counter bumped after every session write.
+
+    Everything derived from a user's sessions (session lists, record, activity,
+    analytics) can only change when this number does, so it doubles as the
+    ETag for those responses. Documents are keyed by the user id string.
+    """
+
+    @staticmethod
+    def get(user_id):
+        data = data_versions_collection.find_one({'_id': str(user_id)}, {'version': 1})
+        return data['version'] if data else 0
+
+    @staticmethod
+    def bump(user_id):
+        """Call after the write is stored, so a reader never sees the new version with old data."""
+        data_versions_collection.update_one(
+            {'_id': str(user_id)},
+            {'$inc': {'version': 1}, '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+
+    @staticmethod
+    def bump_many(user_ids):
+        user_ids = {str(user_id) for user_id in user_ids if user_id}
+        if not user_ids:
+            return
+        now = datetime.utcnow()
+        data_versions_collection.bulk_write([
+            UpdateOne({'_id': user_id}, {'$inc': {'version': 1}, '$set': {'updated_at': now}}, upsert=True)
+            for user_id in user_ids
+        ], ordered=False)
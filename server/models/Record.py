@@ -1,14 +1,19 @@
-from pymongo import MongoClient
-from config import Config
+from pymongo import ReturnDocument, ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from database import get_collection
+from models.Session import APPLIED_SESSIONS_KEPT
 from datetime import datetime, timedelta
 from bson import ObjectId
 
-client = MongoClient(Config.MONGO_URI)
-db = client.get_database("level_up")
-records_collection = db.records
+records_collection = get_collection('records')
 
 
 class Record:
+    __slots__ = (
+        'user_id', 'username', 'total_sessions', 'total_hours', 'total_intervals', 'time_hair',
+        'time_nail', 'time_eye', 'time_nose', 'time_unfocused', 'time_paused', '_id'
+    )
+
     def __init__(
         self,
         user_id,
@@ -37,6 +42,13 @@ class Record:
         self.time_paused = time_paused
         self._id = _id
 
+    @staticmethod
+    def ensure_indexes():
+        # One record per user; also keeps concurrent upserts from creating duplicates
+        records_collection.create_index([('user_id', ASCENDING)], name='user_id_unique', unique=True)
+        # Lets the leaderboard pick up only the records that changed since its last sync
+        records_collection.create_index([('updated_at', ASCENDING)], name='updated_at')
+
     @classmethod
     def from_dict(cls, data):
         return cls(
@@ -55,12 +67,9 @@ class Record:
         )
 
     def to_dict(self):
-        # Helper to clean up float formatting
+        # round() already yields the shortest float repr, no string round-trip needed
         def clean_float(value):
-            if isinstance(value, float):
-                # Round to 2 decimal places and remove binary float artifacts
-                return float(f"{round(value, 2):.2f}")
-            return value
+            return round(value, 2) if isinstance(value, float) else value
 
         return {
             'user_id': str(self.user_id),
@@ -78,32 +87,159 @@ class Record:
 
     def save(self):
         record_data = self.to_dict()
+        record_data['updated_at'] = datetime.utcnow()
         result = records_collection.insert_one(record_data)
         self._id = result.inserted_id
         return self
 
     @classmethod
     def find_by_user_id(cls, user_id):
-        data = records_collection.find_one({"user_id": user_id})
+        data = records_collection.find_one({"user_id": user_id}, {'applied_sessions': 0})
         if data:
             return cls.from_dict(data)
         return None
 
     def update(self):
         record_data = self.to_dict()
+        record_data['updated_at'] = datetime.utcnow()
         records_collection.update_one(
             {'_id': ObjectId(self._id)},
             {'$set': record_data}
         )
         return self
 
+    @staticmethod
+    def iter_for_ranking(changed_since=None):
+        """Raw record dicts (totals only) for the leaderboard, optionally only recent changes."""
+        query = {'updated_at': {'$gte': changed_since}} if changed_since else {}
+        projection = {
+            '_id': 0, 'user_id': 1, 'username': 1, 'total_sessions': 1, 'total_hours': 1,
+            'time_hair': 1, 'time_nail': 1, 'time_eye': 1, 'time_nose': 1,
+            'time_unfocused': 1, 'time_paused': 1
+        }
+        return records_collection.find(query, projection, batch_size=10000)
+
     @classmethod
     def find_by_id(cls, record_id):
-        data = records_collection.find_one({'_id': ObjectId(record_id)})
+        data = records_collection.find_one({'_id': ObjectId(record_id)}, {'applied_sessions': 0})
         if data:
             return cls.from_dict(data)
         return None
 
+    @staticmethod
+    def session_increments(
+        hours,
+        intervals,
+        time_hair,
+        time_nail,
+        time_eye,
+        time_nose,
+        time_unfocused,
+        time_paused
+    ):
+        """$inc document for one session; habit times arrive in seconds and are stored in hours."""
+        return {
+            'total_sessions': 1,
+            'total_hours': hours,
+            'total_intervals': intervals,
+            'time_hair': round((time_hair / 3600), 2),
+            'time_nail': round((time_nail / 3600), 2),
+            'time_eye': round((time_eye / 3600), 2),
+            'time_nose': round((time_nose / 3600), 2),
+            'time_unfocused': round((time_unfocused / 3600), 2),
+            'time_paused': round((time_paused / 3600), 2)
+        }
+
+    @classmethod
+    def increment_for_user(
+        cls,
+        user_id,
+        username,
+        hours,
+        intervals,
+        time_hair,
+        time_nail,
+        time_eye,
+        time_nose,
+        time_unfocused,
+        time_paused
+    ):
+        """Atomically add one session to a user's totals, creating the record if missing."""
+        data = records_collection.find_one_and_update(
+            {'user_id': str(user_id)},
+            {
+                '$inc': cls.session_increments(
+                    hours=hours,
+                    intervals=intervals,
+                    time_hair=time_hair,
+                    time_nail=time_nail,
+                    time_eye=time_eye,
+                    time_nose=time_nose,
+                    time_unfocused=time_unfocused,
+                    time_paused=time_paused
+                ),
+                '$set': {'updated_at': datetime.utcnow()},
+                '$setOnInsert': {'username': username}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return cls.from_dict(data)
+
+    @classmethod
+    def increment_for_sessions(cls, sessions, retry=False):
+        """Apply many sessions (dicts) with one bulk_write holding a single grouped $inc per user.
+
+        Sessions that carry an _id are added to the record's `applied_sessions`.
+        With retry=True every session gets its own update, which is skipped when
+        the record already lists it (it was counted before a failure).
+        """
+        totals = {}
+        usernames = {}
+        session_ids = {}
+        for session in sessions:
+            if not session.get('user_id'):
+                continue
+            user_id = str(session['user_id'])
+            group = (user_id, session['_id']) if retry else user_id
+            increments = cls.session_increments(
+                hours=session['total_hours'],
+                intervals=session['intervals'],
+                time_hair=session['time_hair'],
+                time_nail=session['time_nail'],
+                time_eye=session['time_eye'],
+                time_nose=session['time_nose'],
+                time_unfocused=session['time_unfocused'],
+                time_paused=session['time_paused']
+            )
+            group_totals = totals.setdefault(group, dict.fromkeys(increments, 0))
+            for field, value in increments.items():
+                group_totals[field] += value
+            usernames.setdefault(user_id, session.get('username'))
+            if session.get('_id'):
+                session_ids.setdefault(group, []).append(session['_id'])
+
+        now = datetime.utcnow()
+        operations = []
+        for group, group_totals in totals.items():
+            user_id = group[0] if retry else group
+            filter = {'user_id': user_id}
+            update = {'$inc': group_totals, '$set': {'updated_at': now}, '$setOnInsert': {'username': usernames[user_id]}}
+            if group in session_ids:
+                update['$push'] = {'applied_sessions': {'$each': session_ids[group], '$slice': -APPLIED_SESSIONS_KEPT}}
+            if retry:
+                filter['applied_sessions'] = {'$ne': group[1]}
+            operations.append(UpdateOne(filter, update, upsert=True))
+        if operations:
+            try:
+                records_collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # On retry, a record that already lists the session fails the filter
+                # and its upsert collides with the unique user_id index
+                if not retry or any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                    raise
+        return len(operations)
+
     def increment_sessions(
         self,
         hours,
@@ -115,14 +251,26 @@ class Record:
         time_unfocused,
         time_paused
     ):
-        self.total_sessions += 1
-        self.total_hours += hours
-        self.total_intervals += intervals
-        self.time_hair += round((time_hair / 3600), 2)
-        self.time_nail += round((time_nail / 3600), 2)
-        self.time_eye += round((time_eye / 3600), 2)
-        self.time_nose += round((time_nose / 3600), 2)
-        self.time_unfocused += round((time_unfocused / 3600), 2)
-        self.time_paused += round((time_paused / 3600), 2)
-        self.update()
-        return self
\ No newline at end of file
+        updated = self.increment_for_user(
+            user_id=self.user_id,
+            username=self.username,
+            hours=hours,
+            intervals=intervals,
+            time_hair=time_hair,
+            time_nail=time_nail,
+            time_eye=time_eye,
+            time_nose=time_nose,
+            time_unfocused=time_unfocused,
+            time_paused=time_paused
+        )
+        self.total_sessions = updated.total_sessions
+        self.total_hours = updated.total_hours
+        self.total_intervals = updated.total_intervals
+        self.time_hair = updated.time_hair
+        self.time_nail = updated.time_nail
+        self.time_eye = updated.time_eye
+        self.time_nose = updated.time_nose
+        self.time_unfocused = updated.time_unfocused
+        self.time_paused = updated.time_paused
+        self._id = updated._id
+        return self
@@ -1,13 +1,43 @@
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from database import get_collection
 from config import Config
+from models.SessionBucket import SessionBucket
 from datetime import datetime, timedelta
 from bson import ObjectId
+import base64
+from itertools import islice
+import json
+import math
+
+sessions_collection = get_collection('sessions')
+
+SESSION_FIELDS = [
+    'user_id', 'username', 'date', 'time_started', 'total_hours', 'intervals',
+    'time_per_interval', 'time_hair', 'time_nail', 'time_eye', 'time_nose',
+    'time_unfocused', 'time_paused'
+]
+HABIT_FIELDS = ['time_hair', 'time_nail', 'time_eye', 'time_nose', 'time_unfocused', 'time_paused']
+# Summed into records and rollups, so they must be plain numbers
+NUMERIC_FIELDS = ['total_hours', 'intervals', 'time_per_interval'] + HABIT_FIELDS
+# Keyset pagination order; _id breaks ties between sessions started in the same minute
+PAGE_KEYS = ['date', 'time_started', '_id']
+# Ids of the most recent sessions counted into each record and daily rollup, so
+# a retried batch can tell which of its sessions were already counted there
+APPLIED_SESSIONS_KEPT = 1000
+# Indexes created by earlier versions of ensure_indexes
+SUPERSEDED_INDEXES = ['user_id_date_time_started', 'username']
+
+
+def bucketed():
+    """True when sessions are stored in per-month buckets instead of one document each."""
+    return Config.SESSION_STORAGE == 'buckets'
 
-client = MongoClient(Config.MONGO_URI)
-db = client.get_database("level_up")
-sessions_collection = db.sessions
 
 class Session:
+    # No per-instance __dict__; a list of sessions is a fraction of the size
+    __slots__ = tuple(SESSION_FIELDS) + ('_id',)
+
     def __init__(self,user_id, username, date, time_started, total_hours, intervals, time_per_interval, time_hair, time_nail, time_eye, time_nose, time_unfocused, time_paused, _id=None):
         self.user_id = user_id
         self.username = username
@@ -25,6 +55,48 @@ class Session:
         self._id = _id
 
 
+    @staticmethod
+    def ensure_indexes():
+        # Serves date-range scans (user_id, date) and the paginated recent-sessions sort
+        sessions_collection.create_index(
+            [('user_id', ASCENDING), ('date', ASCENDING), ('time_started', ASCENDING), ('_id', ASCENDING)],
+            name='user_id_date_time_started_id'
+        )
+        # Replaced by user_id_date_time_started_id, and no route looks sessions up by username
+        existing = sessions_collection.index_information()
+        for name in SUPERSEDED_INDEXES:
+            if name in existing:
+                sessions_collection.drop_index(name)
+        # Lets batch uploads be retried without inserting (and counting) a session twice
+        sessions_collection.create_index(
+            [('user_id', ASCENDING), ('idempotency_key', ASCENDING)],
+            name='user_id_idempotency_key_unique',
+            unique=True,
+            partialFilterExpression={'idempotency_key': {'$exists': True}}
+        )
+        if bucketed():
+            SessionBucket.ensure_indexes()
+
+    @staticmethod
+    def validation_error(data):
+        """Why `data` can't be stored as a session, or None if it can."""
+        if not isinstance(data, dict):
+            return "Session must be an object"
+        missing = next((field for field in SESSION_FIELDS if field not in data), None)
+        if missing:
+            return f"{missing} is required"
+        for field in NUMERIC_FIELDS:
+            value = data[field]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                return f"{field} must be a number"
+        try:
+            datetime.strptime(data['date'], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return "date must be in YYYY-MM-DD format"
+        if not isinstance(data['time_started'], str):
+            return "time_started must be a string"
+        return None
+
     @classmethod
     def from_dict(cls, data):
         return cls(
@@ -63,6 +135,11 @@ class Session:
 
     def save(self):
         session_data = self.to_dict()
+        if bucketed():
+            session_data['_id'] = ObjectId()
+            SessionBucket.add(session_data)
+            self._id = session_data['_id']
+            return self
         result = sessions_collection.insert_one(session_data)
         self._id = result.inserted_id
         return self
@@ -70,6 +147,9 @@ class Session:
     def update(self):
         if not self._id:
             raise ValueError("Cannot update - session doesn't have _id")
+        if bucketed():
+            SessionBucket.replace_session({**self.to_dict(), '_id': self._id})
+            return self
 
         sessions_collection.update_one(
             {'_id': self._id},
@@ -77,36 +157,376 @@ class Session:
         )
         return self
 
+    @classmethod
+    def insert_many(cls, sessions, idempotency_keys):
+        """Insert sessions with one unordered insert_many.
+
+        Returns a status per session: ('created', _id), ('duplicate', None) when its
+        idempotency key was already used, or ('failed', message).
+        """
+        documents = []
+        for session, key in zip(sessions, idempotency_keys):
+            document = session.to_dict()
+            if key:
+                document['idempotency_key'] = key
+                # Cleared by mark_applied once the totals include this session
+                document['applied'] = False
+            documents.append(document)
+
+        errors = {}
+        if bucketed():
+            for document in documents:
+                document['_id'] = ObjectId()
+            errors = SessionBucket.add_many(documents)
+        else:
+            try:
+                sessions_collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get('writeErrors', []):
+                    errors[error['index']] = error
+
+        results = []
+        for index, (session, document) in enumerate(zip(sessions, documents)):
+            error = errors.get(index)
+            if error is None:
+                session._id = document['_id']
+                results.append(('created', session._id))
+            elif error.get('code') == 11000:
+                results.append(('duplicate', None))
+            else:
+                results.append(('failed', error.get('errmsg')))
+        return results
+
+    @classmethod
+    def find_unapplied(cls, keys):
+        """Stored sessions for these (user_id, idempotency_key) pairs that the totals don't include yet."""
+        if not keys:
+            return []
+        query = {
+            '$or': [{'user_id': user_id, 'idempotency_key': key} for user_id, key in keys],
+            'applied': False
+        }
+        return list(cls.find_documents(query, scope={'user_id': {'$in': list({user_id for user_id, _ in keys})}}))
+
+    @staticmethod
+    def mark_applied(session_ids):
+        session_ids = list(session_ids)
+        if not session_ids:
+            return
+        if bucketed():
+            SessionBucket.mark_applied(session_ids)
+        else:
+            sessions_collection.update_many({'_id': {'$in': session_ids}}, {'$unset': {'applied': ''}})
+
+    @staticmethod
+    def match_stages(query, scope=None):
+        """Aggregation stages yielding the flat session documents that match `query`.
+
+        With bucketed storage the buckets are first narrowed by the user_id and
+        date range in `scope` (defaults to `query`), then unwound.
+        """
+        if not bucketed():
+            return [{'$match': query}]
+        return SessionBucket.unwind_stages(Session.bucket_query(scope or query), query)
+
+    @staticmethod
+    def bucket_query(scope):
+        """Query on session_buckets for the user_id and date range in `scope`."""
+        bucket_query = {}
+        if 'user_id' in scope:
+            bucket_query['user_id'] = scope['user_id']
+        if isinstance(scope.get('date'), dict):
+            date = scope['date']
+            months = SessionBucket.month_range(date.get('$gte', date.get('$gt')), date.get('$lte', date.get('$lt')))
+            if months:
+                bucket_query['month'] = months
+        return bucket_query
+
+    @classmethod
+    def limit_scope(cls, scope, direction, limit):
+        """Narrow `scope` to the fewest months, taken in `direction`, whose buckets hold `limit` sessions.
+
+        Returns None when every month in scope is needed anyway. Only the
+        bucket counts are read, so a first page doesn't unwind a user's whole
+        history.
+        """
+        seen = 0
+        for bucket in SessionBucket.find(cls.bucket_query(scope), direction, projection={'month': 1, 'count': 1}):
+            seen += bucket.get('count', 0)
+            if seen >= limit:
+                month = bucket['month'].strftime('%Y-%m')
+                bound = {'$gte': f'{month}-01'} if direction == DESCENDING else {'$lte': f'{month}-31'}
+                date = scope.get('date') if isinstance(scope.get('date'), dict) else {}
+                return {**scope, 'date': {**date, **bound}}
+        return None
+
+    @staticmethod
+    def aggregate(pipeline):
+        if bucketed():
+            return SessionBucket.aggregate(pipeline)
+        return sessions_collection.aggregate(pipeline)
+
+    @classmethod
+    def find_documents(cls, query, sort=None, limit=None, projection=None, scope=None):
+        """sessions_collection.find() that also works with bucketed storage."""
+        if not bucketed():
+            documents = sessions_collection.find(query, projection)
+            if sort:
+                documents = documents.sort(sort)
+            if limit:
+                documents = documents.limit(limit)
+            return documents
+
+        def run(scope):
+            pipeline = cls.match_stages(query, scope)
+            if sort:
+                pipeline.append({'$sort': dict(sort)})
+            if limit:
+                pipeline.append({'$limit': limit})
+            if projection:
+                pipeline.append({'$project': projection})
+            return cls.aggregate(pipeline)
+
+        scope = scope or query
+        if limit and sort and sort[0][0] == 'date':
+            narrowed = cls.limit_scope(scope, sort[0][1], limit)
+            if narrowed:
+                documents = list(run(narrowed))
+                # Short only if `query` filtered out sessions those months hold
+                if len(documents) >= limit:
+                    return documents
+        return run(scope)
+
     @classmethod
     def find_by_id(cls, record_id):
+        if bucketed():
+            data = SessionBucket.find_session(ObjectId(record_id))
+            return cls.from_dict(data) if data else None
         data = sessions_collection.find_one({'_id': ObjectId(record_id)})
         if data:
             return cls.from_dict(data)
         return None
 
+    @staticmethod
+    def find_user_id(session_id):
+        """Owner of a session, fetched without loading the rest of the document."""
+        if not ObjectId.is_valid(session_id):
+            return None
+        if bucketed():
+            data = SessionBucket.find_session(ObjectId(session_id))
+            return data.get('user_id') if data else None
+        data = sessions_collection.find_one({'_id': ObjectId(session_id)}, {'user_id': 1})
+        return data.get('user_id') if data else None
+
     @classmethod
     def find_by_user_id(cls, user_id):
-        records = sessions_collection.find({'user_id': user_id})
+        records = cls.find_documents({'user_id': user_id})
         return [cls.from_dict(record) for record in records]
 
     @classmethod
     def find_by_username(cls, username):
 
-        records = sessions_collection.find({'username': username})
+        records = cls.find_documents({'username': username})
         return [cls.from_dict(record) for record in records]
 
+    @classmethod
+    def distinct_user_ids(cls):
+        if bucketed():
+            return SessionBucket.distinct_user_ids()
+        return sessions_collection.distinct('user_id')
+
     @classmethod
     def get_user_sessions_in_date_range(cls, user_id, start_date, end_date):
         query = {
             'user_id': user_id,
             'date': {'$gte': start_date, '$lte': end_date}
         }
-        records = sessions_collection.find(query).sort('date', 1)  # Sort by date ascending
+        records = cls.find_documents(query, sort=[('date', 1)])  # Sort by date ascending
         return [cls.from_dict(record) for record in records]
 
+    @classmethod
+    def migrate_to_buckets(cls, user_id, batch_size=1000):
+        """Copy a user's session documents into buckets; safe to re-run.
+
+        Returns (copied, already_present, failed).
+        """
+        copied = present = failed = 0
+        documents = sessions_collection.find({'user_id': user_id}).sort('_id', ASCENDING)
+        while True:
+            batch = list(islice(documents, batch_size))
+            if not batch:
+                break
+            errors = SessionBucket.add_many(batch)
+            duplicates = sum(1 for error in errors.values() if error.get('code') == 11000)
+            copied += len(batch) - len(errors)
+            present += duplicates
+            failed += len(errors) - duplicates
+        return copied, present, failed
+
     @classmethod
     def get_recent_sessions(cls, user_id, limit):
-        records = sessions_collection.find({'user_id': user_id})\
-                             .sort([('date', -1), ('time_started', -1)])\
-                             .limit(limit)
-        return [cls.from_dict(record) for record in records]
\ No newline at end of file
+        records = cls.find_documents({'user_id': user_id}, sort=[('date', -1), ('time_started', -1)], limit=limit)
+        return [cls.from_dict(record) for record in records]
+
+    @staticmethod
+    def encode_cursor(document):
+        values = [document['date'], document['time_started'], str(document['_id'])]
+        return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Raises ValueError for anything that isn't a cursor produced by encode_cursor."""
+        try:
+            date, time_started, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return date, time_started, ObjectId(session_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+
+    @classmethod
+    def find_page(cls, query, direction, limit=None, cursor=None, fields=None):
+        """Keyset-paginated find ordered by (date, time_started, _id).
+
+        Returns (rows, next_cursor). Rows are plain dicts holding only `fields`
+        (all session fields by default) and next_cursor is None on the last page.
+        """
+        fields = fields or SESSION_FIELDS
+        scope = query
+        if cursor:
+            date, time_started, session_id = cls.decode_cursor(cursor)
+            op = '$gt' if direction == ASCENDING else '$lt'
+            # Only lets bucketed storage skip months before/after the cursor
+            scope = {**query, 'date': {**(query.get('date') or {}), ('$gte' if direction == ASCENDING else '$lte'): date}}
+            query = {'$and': [query, {'$or': [
+                {'date': {op: date}},
+                {'date': date, 'time_started': {op: time_started}},
+                {'date': date, 'time_started': time_started, '_id': {op: session_id}}
+            ]}]}
+
+        projection = dict.fromkeys(fields + PAGE_KEYS, 1)
+        if not limit:
+            # No cursor to build, so don't decode an ObjectId per row just to drop it
+            projection = dict.fromkeys(fields, 1)
+            projection['_id'] = 0
+        documents = list(cls.find_documents(
+            query,
+            sort=[(key, direction) for key in PAGE_KEYS],
+            limit=limit + 1 if limit else None,
+            projection=projection,
+            scope=scope
+        ))
+
+        next_cursor = None
+        if limit and len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = cls.encode_cursor(documents[-1])
+        return cls.to_rows(documents, fields), next_cursor
+
+    @staticmethod
+    def to_rows(documents, fields):
+        """Turn projected session documents into response rows in place.
+
+        Each decoded dict is reused as its row: page keys the caller didn't ask
+        for are dropped and missing fields set to None, instead of copying every
+        field into a second dict.
+        """
+        extras = [key for key in PAGE_KEYS if key not in fields]
+        for document in documents:
+            for key in extras:
+                document.pop(key, None)
+            if len(document) != len(fields):
+                for field in fields:
+                    document.setdefault(field, None)
+        return documents
+
+    @classmethod
+    def get_recent_page(cls, user_id, limit, cursor=None, fields=None):
+        return cls.find_page({'user_id': user_id}, DESCENDING, limit=limit, cursor=cursor, fields=fields)
+
+    @classmethod
+    def get_date_range_page(cls, user_id, start_date, end_date, limit=None, cursor=None, fields=None):
+        query = {
+            'user_id': user_id,
+            'date': {'$gte': start_date, '$lte': end_date}
+        }
+        return cls.find_page(query, ASCENDING, limit=limit, cursor=cursor, fields=fields)
+
+    @classmethod
+    def iter_user_sessions(cls, user_id, start_date=None, end_date=None, fields=None):
+        """Cursor over a user's sessions as plain dicts, oldest first, without loading them all."""
+        query = {'user_id': user_id}
+        date = {}
+        if start_date:
+            date['$gte'] = start_date
+        if end_date:
+            date['$lte'] = end_date
+        if date:
+            query['date'] = date
+        projection = dict.fromkeys((fields or SESSION_FIELDS) + PAGE_KEYS, 1)
+        return cls.find_documents(query, sort=[(key, ASCENDING) for key in PAGE_KEYS], projection=projection)
+
+    @classmethod
+    def get_analytics(cls, user_id, start_date, end_date):
+        """Summaries of a user's sessions in a date window, computed by one $facet aggregation."""
+        habit_sums = {field: {'$sum': f'${field}'} for field in HABIT_FIELDS}
+        totals = {'sessions': {'$sum': 1}, 'total_hours': {'$sum': '$total_hours'}, 'intervals': {'$sum': '$intervals'}}
+
+        pipeline = cls.match_stages({'user_id': user_id, 'date': {'$gte': start_date, '$lte': end_date}}) + [
+            {'$facet': {
+                'weekly': [
+                    {'$group': {
+                        '_id': {'$dateToString': {
+                            'format': '%G-W%V',
+                            'date': {'$dateFromString': {'dateString': '$date', 'onError': None}}
+                        }},
+                        **totals
+                    }},
+                    {'$sort': {'_id': 1}}
+                ],
+                'monthly': [
+                    {'$group': {'_id': {'$substrBytes': ['$date', 0, 7]}, **totals, **habit_sums}},
+                    {'$sort': {'_id': 1}}
+                ],
+                'hour_of_day': [
+                    {'$bucket': {
+                        # "HH:MM" -> HH; anything unparseable lands in the default bucket
+                        'groupBy': {'$convert': {
+                            'input': {'$substrBytes': ['$time_started', 0, 2]},
+                            'to': 'int',
+                            'onError': -1,
+                            'onNull': -1
+                        }},
+                        'boundaries': list(range(25)),
+                        'default': 'unknown',
+                        'output': totals
+                    }}
+                ],
+                'overall': [
+                    {'$group': {'_id': None, **totals, **habit_sums}}
+                ]
+            }}
+        ]
+        facets = next(cls.aggregate(pipeline))
+
+        def clean(row):
+            row = {key: value for key, value in row.items() if key != '_id'}
+            row['total_hours'] = round(row['total_hours'], 2)
+            return row
+
+        overall = facets['overall'][0] if facets['overall'] else dict.fromkeys(['total_hours'] + HABIT_FIELDS, 0)
+        total_seconds = overall['total_hours'] * 3600
+        hours = {row['_id']: row for row in facets['hour_of_day'] if row['_id'] != 'unknown'}
+
+        return {
+            'weekly': [{'week': row['_id'], **clean(row)} for row in facets['weekly']],
+            'monthly': [{'month': row['_id'], **clean(row)} for row in facets['monthly']],
+            'habits': {field: overall[field] for field in HABIT_FIELDS},
+            'hour_of_day': [
+                {'hour': hour, **clean(hours.get(hour, {'sessions': 0, 'total_hours': 0, 'intervals': 0}))}
+                for hour in range(24)
+            ],
+            'focus': {
+                'total_hours': round(overall['total_hours'], 2),
+                'unfocused_ratio': round(overall['time_unfocused'] / total_seconds, 4) if total_seconds else 0,
+                'paused_ratio': round(overall['time_paused'] / total_seconds, 4) if total_seconds else 0
+            }
+        }
@@ -0,0 +1,220 @@
+from pymongo import UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from database import get_collection
+from datetime import datetime
+
+session_buckets_collection = get_collection('session_buckets')
+
+# Summed into each bucket's `totals` as sessions are added; habit times stay in seconds
+TOTAL_FIELDS = [
+    'total_hours', 'intervals', 'time_hair', 'time_nail',
+    'time_eye', 'time_nose', 'time_unfocused', 'time_paused'
+]
+
+
+class SessionBucket:
+    """One document per user and calendar month holding that month's sessions.
+
+    {user_id, month: datetime(YYYY, MM, 1), count, totals: {...}, sessions: [...]}
+
+    Embedded sessions keep their own _id (and idempotency_key, if any) but not
+    user_id, which lives on the bucket. A year of history is at most twelve
+    documents, and `totals` gives monthly sums without reading the sessions.
+    """
+
+    @staticmethod
+    def ensure_indexes():
+        session_buckets_collection.create_index(
+            [('user_id', ASCENDING), ('month', ASCENDING)],
+            name='user_id_month_unique',
+            unique=True
+        )
+        # get-session looks sessions up by their own _id
+        session_buckets_collection.create_index([('sessions._id', ASCENDING)], name='sessions_id')
+
+    @staticmethod
+    def month_of(date):
+        """'YYYY-MM-DD' -> first day of that month as a datetime."""
+        try:
+            return datetime.strptime(date[:7], '%Y-%m')
+        except (TypeError, ValueError):
+            raise ValueError("date must be in YYYY-MM-DD format")
+
+    @staticmethod
+    def month_range(start_date=None, end_date=None):
+        """Query on `month` covering the buckets that can hold dates in [start_date, end_date]."""
+        month = {}
+        if start_date:
+            month['$gte'] = SessionBucket.month_of(start_date)
+        if end_date:
+            month['$lte'] = SessionBucket.month_of(end_date)
+        return month
+
+    @staticmethod
+    def _entry(document):
+        return {key: value for key, value in document.items() if key != 'user_id'}
+
+    @staticmethod
+    def _increments(documents):
+        increments = {'count': len(documents)}
+        for field in TOTAL_FIELDS:
+            increments[f'totals.{field}'] = sum(document.get(field) or 0 for document in documents)
+        return increments
+
+    @classmethod
+    def _push(cls, document):
+        """(filter, update) appending one session document to its month's bucket."""
+        # Matches nothing if the session (or its idempotency key) is already in the
+        # bucket, so the upsert then collides with the unique (user_id, month) index
+        filter = {
+            'user_id': document['user_id'],
+            'month': cls.month_of(document['date']),
+            'sessions._id': {'$ne': document['_id']}
+        }
+        if document.get('idempotency_key'):
+            filter['sessions.idempotency_key'] = {'$ne': document['idempotency_key']}
+        return filter, {'$push': {'sessions': cls._entry(document)}, '$inc': cls._increments([document])}
+
+    @classmethod
+    def add(cls, document):
+        """Add one session document (which must already have an _id)."""
+        filter, update = cls._push(document)
+        try:
+            session_buckets_collection.update_one(filter, update, upsert=True)
+        except DuplicateKeyError:
+            # Another request created this month's bucket first
+            session_buckets_collection.update_one(filter, update, upsert=True)
+
+    @classmethod
+    def add_many(cls, documents):
+        """Add session documents with one unordered bulk write.
+
+        Documents must already have an _id. Returns {index: error} shaped like
+        BulkWriteError's writeErrors; code 11000 means the session (or its
+        idempotency key) is already stored, so adding is safe to repeat.
+        """
+        errors = {}
+        pending = []
+        for index, document in enumerate(documents):
+            try:
+                pending.append((index, UpdateOne(*cls._push(document), upsert=True)))
+            except ValueError as e:
+                errors[index] = {'code': None, 'errmsg': str(e)}
+
+        for attempt in range(2):
+            if not pending:
+                break
+            failed = {}
+            try:
+                session_buckets_collection.bulk_write([operation for _, operation in pending], ordered=False)
+            except BulkWriteError as e:
+                failed = {error['index']: error for error in e.details.get('writeErrors', [])}
+
+            retry = []
+            for position, (index, operation) in enumerate(pending):
+                error = failed.get(position)
+                if error is None:
+                    continue
+                if error.get('code') == 11000 and attempt == 0:
+                    # A real duplicate or a race creating the bucket; only a
+                    # real duplicate collides again on the second attempt
+                    retry.append((index, operation))
+                else:
+                    errors[index] = error
+            pending = retry
+        return errors
+
+    @staticmethod
+    def mark_applied(session_ids):
+        """Clear the `applied` flag on embedded sessions (see Session.mark_applied)."""
+        session_buckets_collection.bulk_write([
+            UpdateOne({'sessions._id': session_id}, {'$unset': {'sessions.$.applied': ''}})
+            for session_id in session_ids
+        ], ordered=False)
+
+    @classmethod
+    def replace_session(cls, document):
+        """Overwrite the fields of a stored session (document has _id) and adjust its bucket's totals.
+
+        Returns False if no session has that _id. The update is conditional on the
+        stored values it was computed from and is recomputed if they changed.
+        """
+        fields = {key: value for key, value in cls._entry(document).items() if key != '_id'}
+        while True:
+            stored = cls.find_session(document['_id'])
+            if stored is None:
+                return False
+            current = {key: stored.get(key) for key in ['date'] + TOTAL_FIELDS}
+            match = {'sessions': {'$elemMatch': {'_id': document['_id'], **current}}}
+
+            if cls.month_of(stored['date']) != cls.month_of(document['date']):
+                # Moves to another month: take it out of the old bucket, then add it
+                removed = session_buckets_collection.update_one(match, {
+                    '$pull': {'sessions': {'_id': document['_id']}},
+                    '$inc': {field: -value for field, value in cls._increments([stored]).items()}
+                })
+                if removed.modified_count:
+                    cls.add({**stored, **fields})
+                    return True
+                continue
+
+            increments = {
+                f'totals.{field}': (fields.get(field) or 0) - (stored.get(field) or 0)
+                for field in TOTAL_FIELDS
+            }
+            updated = session_buckets_collection.update_one(match, {
+                '$set': {f'sessions.$.{key}': value for key, value in fields.items()},
+                '$inc': increments
+            })
+            if updated.matched_count:
+                return True
+
+    @classmethod
+    def find_session(cls, session_id):
+        """The flat session document with this _id, or None."""
+        data = session_buckets_collection.find_one(
+            {'sessions._id': session_id},
+            {'user_id': 1, 'sessions': {'$elemMatch': {'_id': session_id}}}
+        )
+        if not data or not data.get('sessions'):
+            return None
+        return {**data['sessions'][0], 'user_id': data['user_id']}
+
+    @staticmethod
+    def find(query, direction=ASCENDING, projection=None):
+        """Buckets matching `query`, in month order."""
+        return session_buckets_collection.find(query, projection).sort('month', direction)
+
+    @staticmethod
+    def unwind_stages(query, session_query=None):
+        """Aggregation stages that turn matching buckets back into flat session documents."""
+        stages = [
+            {'$match': query},
+            {'$unwind': '$sessions'},
+            {'$addFields': {'sessions.user_id': '$user_id'}},
+            {'$replaceRoot': {'newRoot': '$sessions'}}
+        ]
+        if session_query:
+            stages.append({'$match': session_query})
+        return stages
+
+    @staticmethod
+    def aggregate(pipeline):
+        return session_buckets_collection.aggregate(pipeline)
+
+    @staticmethod
+    def distinct_user_ids():
+        return session_buckets_collection.distinct('user_id')
+
+    @staticmethod
+    def monthly_totals(user_id, start_date=None, end_date=None):
+        """[{month: 'YYYY-MM', sessions, <TOTAL_FIELDS>}], read from the precomputed sums only."""
+        query = {'user_id': user_id}
+        months = SessionBucket.month_range(start_date, end_date)
+        if months:
+            query['month'] = months
+        buckets = session_buckets_collection.find(query, {'month': 1, 'count': 1, 'totals': 1}).sort('month', ASCENDING)
+        return [
+            {'month': bucket['month'].strftime('%Y-%m'), 'sessions': bucket['count'], **bucket['totals']}
+            for bucket in buckets
+        ]
@@ -1,27 +1,91 @@
-from pymongo import MongoClient
+import threading
+import time
+from pymongo import ASCENDING
+from database import get_collection
+from cache import TTLCache
 from config import Config
+from password_pool import password_pool
 import bcrypt
 from datetime import datetime, timedelta
 import jwt
 from bson import ObjectId
 
-client = MongoClient(Config.MONGO_URI)
-db = client.get_database("level_up")
-users_collection = db.users
+users_collection = get_collection('users')
+
+
+class PublicDataCache(TTLCache):
+    """user_id -> public user data, read on every token check.
+
+    User.update() drops the entry in its own process. Other workers find the
+    change through the users' `updated_at`: every `sync_seconds` a get() first
+    evicts the users updated since the last check, so a rename is visible
+    everywhere within that interval rather than the full TTL.
+    """
+
+    def __init__(self, sync_seconds=5, **kwargs):
+        super().__init__(**kwargs)
+        self.sync_seconds = sync_seconds
+        self._synced_at = None
+        self._checked = 0.0
+        self._sync_lock = threading.Lock()
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked < self.sync_seconds:
+            return
+        with self._sync_lock:
+            if not force and now - self._checked < self.sync_seconds:
+                return
+            self._checked = now
+            started = datetime.utcnow()
+            if self._synced_at is not None:
+                # Overlap a little for clock skew between workers
+                changed = users_collection.find({'updated_at': {'$gte': self._synced_at - timedelta(seconds=1)}}, {'_id': 1})
+                for user_data in changed:
+                    self.delete(str(user_data['_id']))
+            self._synced_at = started
+
+    def get(self, key):
+        self.sync()
+        return super().get(key)
+
+
+public_data_cache = PublicDataCache(
+    sync_seconds=Config.AUTH_CACHE_SYNC_SECONDS,
+    max_entries=Config.AUTH_CACHE_MAX_ENTRIES,
+    ttl=Config.AUTH_CACHE_TTL_SECONDS
+)
 
 class User:
+    __slots__ = ('username', 'email', 'password_hash', '_id')
+
     def __init__(self, username, email, password_hash=None, _id=None):
         self.username = username
         self.email = email
         self.password_hash = password_hash
         self._id = _id
 
+    @staticmethod
+    def ensure_indexes():
+        users_collection.create_index([('email', ASCENDING)], name='email_unique', unique=True)
+        users_collection.create_index([('username', ASCENDING)], name='username_unique', unique=True)
+        # Lets other workers find recently updated users (see PublicDataCache)
+        users_collection.create_index([('updated_at', ASCENDING)], name='updated_at', sparse=True)
+
     @staticmethod
     def hash_password(password):
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        salt = bcrypt.gensalt(rounds=Config.BCRYPT_ROUNDS)
+        return password_pool.run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
 
     def verify_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))    
+        return password_pool.run(bcrypt.checkpw, password.encode('utf-8'), self.password_hash.encode('utf-8'))
+
+    def needs_rehash(self):
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>
+        try:
+            return int(self.password_hash.split('$')[2]) != Config.BCRYPT_ROUNDS
+        except (IndexError, ValueError):
+            return False
 
     def to_dict(self):
         return {
@@ -45,6 +109,37 @@ class User:
         self._id = result.inserted_id
         return self
 
+    def update(self):
+        if not self._id:
+            raise ValueError("Cannot update - user doesn't have _id")
+
+        users_collection.update_one(
+            {'_id': ObjectId(self._id)},
+            {'$set': {**self.to_dict(), 'updated_at': datetime.utcnow()}}
+        )
+        public_data_cache.delete(str(self._id))
+        return self
+
+    def public_data(self):
+        return {
+            'id': str(self._id),
+            'username': self.username,
+            'email': self.email
+        }
+
+    @classmethod
+    def get_public_data(cls, user_id):
+        """Public data for `user_id` (or None), served from a short-lived cache."""
+        user_id = str(user_id)
+        user_data = public_data_cache.get(user_id)
+        if user_data is None:
+            user = cls.find_by_id(user_id)
+            if not user:
+                return None
+            user_data = user.public_data()
+            public_data_cache.set(user_id, user_data)
+        return user_data
+
     @classmethod
     def find_by_email(cls, email):
         user_data = users_collection.find_one({'email': email})
@@ -66,3 +161,9 @@ class User:
             return cls.from_dict(user_data)
         return None
 
+    @classmethod
+    def existing_ids(cls, user_ids):
+        """Return the subset of `user_ids` (strings) that belong to a user, in one query."""
+        object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+        found = users_collection.find({'_id': {'$in': object_ids}}, {'_id': 1})
+        return {str(user_data['_id']) for user_data in found}
@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when no hashing slot frees up within Config.BCRYPT_QUEUE_TIMEOUT_SECONDS."""
+
+
+class PasswordPool:
+    """Bounded thread pool for bcrypt work.
+
+    bcrypt releases the GIL, so `workers` threads really do hash in parallel,
+    while the semaphore caps how many requests may wait for one at a time.
+    """
+
+    def __init__(self, workers, max_queued, queue_timeout):
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_queued)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+
+    def _record_queue_time(self, waited):
+        with self._lock:
+            self.queue_seconds_total += waited
+            self.queue_seconds_max = max(self.queue_seconds_max, waited)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy("Too many password operations in progress")
+
+        submitted = time.monotonic()
+
+        def task():
+            self._record_queue_time(time.monotonic() - submitted)
+            return fn(*args)
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self._executor.submit(task).result()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'queue_seconds_total': round(self.queue_seconds_total, 6),
+                'queue_seconds_max': round(self.queue_seconds_max, 6)
+            }
+
+
+password_pool = PasswordPool(
+    workers=Config.BCRYPT_WORKERS,
+    max_queued=Config.BCRYPT_MAX_QUEUED,
+    queue_timeout=Config.BCRYPT_QUEUE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,266 @@
+"""
+Write-behind ingestion for /api/create-session.
+
+With SESSION_INGEST_MODE=queue the endpoint only validates the payload, stages
+it in the `session_queue` collection and answers 202. Worker threads claim
+staged sessions in batches under a lease and write them with the same path
+as /api/create-sessions. A worker that dies mid-batch leaves its lease to
+expire, and the batch is claimed again. Every staged session carries an
+idempotency key, so a batch that is written twice, or a client that retries
+its POST, still stores and counts the session only once. Entries that can't
+be written (invalid payloads, sessions whose totals can't be updated, or
+entries claimed SESSION_QUEUE_MAX_ATTEMPTS times) are marked failed and kept
+for inspection, so they never hold up the rest of a batch.
+"""
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from cache import hash_key
+from config import Config
+from database import get_collection
+from models.DailyActivity import DailyActivity
+from models.DataVersion import DataVersion
+from models.Record import Record
+from models.Session import Session
+from models.User import User
+
+
+def fold_sessions(sessions, retry=False):
+    """Add stored sessions (dicts with _id) to records and daily rollups, then mark them applied."""
+    DailyActivity.add_sessions(sessions, retry=retry)
+    Record.increment_for_sessions(sessions, retry=retry)
+    Session.mark_applied(session['_id'] for session in sessions if session.get('idempotency_key'))
+    DataVersion.bump_many(session['user_id'] for session in sessions)
+
+
+def fold_or_isolate(sessions, retry=False):
+    """fold_sessions, falling back to one session at a time if the batch fails.
+
+    Returns {_id: message} for the sessions that could not be folded; they
+    stay stored with applied: false. Mongo errors are raised instead, since
+    the whole batch can succeed when it is tried again.
+    """
+    try:
+        fold_sessions(sessions, retry=retry)
+        return {}
+    except PyMongoError:
+        raise
+    except Exception:
+        pass
+    errors = {}
+    for session in sessions:
+        try:
+            # Part of the batch may have been applied before it failed
+            fold_sessions([session], retry=True)
+        except PyMongoError:
+            raise
+        except Exception as e:
+            errors[session['_id']] = f"Stored but not fully counted: {e}"
+    return errors
+
+
+def write_sessions(payloads, idempotency_keys):
+    """Store validated session payloads and fold them into records and rollups.
+
+    Returns a status per payload: ('created', _id), ('duplicate', None) or
+    ('failed', message). A duplicate whose earlier attempt failed before the
+    totals were updated is folded in now, so retrying a failed call neither
+    loses nor double counts sessions.
+    """
+    statuses = [None] * len(payloads)
+    valid = []
+    for index, payload in enumerate(payloads):
+        error = Session.validation_error(payload)
+        if error:
+            statuses[index] = ('failed', error)
+        else:
+            valid.append(index)
+
+    user_ids = {str(payloads[index]['user_id']) for index in valid if payloads[index]['user_id']}
+    existing_user_ids = User.existing_ids(user_ids)
+    to_insert = []
+    for index in valid:
+        user_id = payloads[index]['user_id']
+        if user_id and str(user_id) not in existing_user_ids:
+            statuses[index] = ('failed', "User not found")
+        else:
+            to_insert.append(index)
+
+    created = []
+    retried = {}
+    index_of = {}
+    if to_insert:
+        sessions = [Session.from_dict(payloads[index]) for index in to_insert]
+        keys = [idempotency_keys[index] for index in to_insert]
+        results = Session.insert_many(sessions, keys)
+        for index, session, key, status in zip(to_insert, sessions, keys, results):
+            statuses[index] = status
+            if status[0] == 'created':
+                created.append({**session.to_dict(), '_id': session._id, 'idempotency_key': key})
+                index_of[session._id] = index
+            elif status[0] == 'duplicate':
+                retried[(session.user_id, key)] = index
+
+    errors = fold_or_isolate(created) if created else {}
+    recovered = Session.find_unapplied(list(retried))
+    if recovered:
+        errors.update(fold_or_isolate(recovered, retry=True))
+    for session in recovered:
+        index_of[session['_id']] = retried[(session['user_id'], session['idempotency_key'])]
+    for session_id, message in errors.items():
+        statuses[index_of[session_id]] = ('failed', message)
+    return statuses
+
+
+def default_idempotency_key(payload):
+    """Key for payloads sent without one: a retried POST carries the same body."""
+    return hash_key(*(f'{field}={payload[field]}' for field in sorted(payload)))
+
+
+class SessionQueue:
+    def __init__(self, collection_name, batch_size=200, workers=1, poll_interval=0.5, lease_seconds=60, max_attempts=5):
+        self.collection = get_collection(collection_name)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.processed = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._started_pid = None
+        self._stop = threading.Event()
+
+    def ensure_indexes(self):
+        self.collection.create_index([('status', ASCENDING), ('lease_until', ASCENDING)], name='status_lease_until')
+        self.collection.create_index([('status', ASCENDING), ('enqueued_at', ASCENDING)], name='status_enqueued_at')
+
+    def enqueue(self, payload):
+        """Stage a session; returns (idempotency_key, queued) where queued is False for a repeat."""
+        key = payload.get('idempotency_key') or default_idempotency_key(payload)
+        document = {
+            '_id': key,
+            'payload': payload,
+            'status': 'pending',
+            'enqueued_at': datetime.utcnow(),
+            'lease_until': None,
+            'attempts': 0
+        }
+        try:
+            self.collection.insert_one(document)
+            queued = True
+        except DuplicateKeyError:
+            # Still waiting to be written from an earlier attempt
+            queued = False
+        self.ensure_started()
+        return key, queued
+
+    def claim(self, worker_id):
+        """Lease up to batch_size pending (or abandoned) entries to `worker_id`."""
+        now = datetime.utcnow()
+        # Entries whose lease keeps running out are set aside instead of retried forever
+        self.collection.update_many(
+            {'status': 'processing', 'lease_until': {'$lt': now}, 'attempts': {'$gte': self.max_attempts}},
+            {'$set': {'status': 'failed', 'error': f"Gave up after {self.max_attempts} attempts"}}
+        )
+        claimable = {'$or': [
+            {'status': 'pending'},
+            {'status': 'processing', 'lease_until': {'$lt': now}}
+        ]}
+        ids = [doc['_id'] for doc in self.collection.find(claimable, {'_id': 1}).sort('enqueued_at', ASCENDING).limit(self.batch_size)]
+        if not ids:
+            return []
+        self.collection.update_many(
+            {'$and': [{'_id': {'$in': ids}}, claimable]},
+            {
+                '$set': {'status': 'processing', 'worker': worker_id, 'lease_until': now + timedelta(seconds=self.lease_seconds)},
+                '$inc': {'attempts': 1}
+            }
+        )
+        # Entries another worker leased in between are left to it
+        return list(self.collection.find({'_id': {'$in': ids}, 'worker': worker_id, 'status': 'processing'}))
+
+    def process(self, entries):
+        statuses = write_sessions([entry['payload'] for entry in entries], [entry['_id'] for entry in entries])
+
+        done = []
+        failed = {}
+        for entry, (status, detail) in zip(entries, statuses):
+            if status == 'failed':
+                failed[entry['_id']] = detail
+            else:
+                # A duplicate was stored by a worker that died before updating the
+                # totals; write_sessions has applied them by now, so it is done too
+                done.append(entry['_id'])
+        if done:
+            self.collection.delete_many({'_id': {'$in': done}})
+        for entry_id, message in failed.items():
+            # Kept for inspection instead of being retried forever
+            self.collection.update_one({'_id': entry_id}, {'$set': {'status': 'failed', 'error': message}})
+
+        with self._lock:
+            self.batches += 1
+            self.processed += sum(1 for status, _ in statuses if status == 'created')
+            self.duplicates += sum(1 for status, _ in statuses if status == 'duplicate')
+            self.failed += len(failed)
+
+    def drain_once(self, worker_id):
+        entries = self.claim(worker_id)
+        if entries:
+            self.process(entries)
+        return len(entries)
+
+    def run_worker(self, worker_id=None):
+        worker_id = worker_id or f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        while not self._stop.is_set():
+            try:
+                if self.drain_once(worker_id) < self.batch_size:
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                print(f"Session queue worker error: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def ensure_started(self):
+        """Start the worker threads once per process (again after a fork)."""
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self.run_worker, name=f'session-queue-{i}', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        waiting = {'status': {'$in': ['pending', 'processing']}}
+        depth = self.collection.count_documents(waiting)
+        oldest = self.collection.find_one(waiting, {'enqueued_at': 1}, sort=[('enqueued_at', ASCENDING)])
+        lag = (datetime.utcnow() - oldest['enqueued_at']).total_seconds() if oldest else 0
+        with self._lock:
+            return {
+                'depth': depth,
+                'lag_seconds': round(lag, 3),
+                'dead': self.collection.count_documents({'status': 'failed'}),
+                'processed': self.processed,
+                'duplicates': self.duplicates,
+                'failed': self.failed,
+                'batches': self.batches
+            }
+
+
+session_queue = SessionQueue(
+    'session_queue',
+    batch_size=Config.SESSION_QUEUE_BATCH_SIZE,
+    workers=Config.SESSION_QUEUE_WORKERS,
+    poll_interval=Config.SESSION_QUEUE_POLL_SECONDS,
+    lease_seconds=Config.SESSION_QUEUE_LEASE_SECONDS,
+    max_attempts=Config.SESSION_QUEUE_MAX_ATTEMPTS
+)
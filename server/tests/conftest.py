@@ -0,0 +1,104 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import types
+
+import mongomock
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+# Read by Config at import time, so they must be set before the app is imported
+os.environ.setdefault('MONGO_DB_NAME', 'lockin_test')
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('RATE_LIMIT_BACKEND', 'none')
+os.environ.setdefault('TTS_CACHE_DIR', tempfile.mkdtemp(prefix='lockin-test-tts-'))
+
+import database
+
+
+@pytest.fixture(autouse=True)
+def mongo(monkeypatch):
+    """A fresh in-memory MongoDB (mongomock) for every test."""
+    monkeypatch.setattr(database, 'MongoClient', mongomock.MongoClient)
+    monkeypatch.setattr(database, '_client', None)
+    return database.get_db()
+
+
+@pytest.fixture
+def app_module(mongo):
+    import app
+    app.ensure_indexes()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def user(app_module):
+    from models.User import User
+    from models.Record import Record
+    user = User(username='tester', email='tester@example.com', password_hash='unused').save()
+    Record(
+        user_id=user._id, username=user.username, total_sessions=0, total_intervals=0, total_hours=0,
+        time_hair=0, time_nail=0, time_eye=0, time_nose=0, time_unfocused=0, time_paused=0
+    ).save()
+    return user
+
+
+def session_payload(user, **overrides):
+    payload = {
+        'user_id': str(user._id),
+        'username': user.username,
+        'date': '2025-03-14',
+        'time_started': '09:30',
+        'total_hours': 1.5,
+        'intervals': 3,
+        'time_per_interval': 25,
+        'time_hair': 36,
+        'time_nail': 72,
+        'time_eye': 0,
+        'time_nose': 18,
+        'time_unfocused': 360,
+        'time_paused': 180
+    }
+    payload.update(overrides)
+    return payload
+
+
+class FakeGemini:
+    """Stands in for genai.Client; records the prompts it was sent."""
+
+    def __init__(self, answer='Study in 25 minute blocks.', delay=0):
+        self.answer = answer
+        self.delay = delay
+        self.prompts = []
+        self.models = self
+        # client.aio.models, used by the ASGI handlers
+        self.aio = types.SimpleNamespace(models=types.SimpleNamespace(generate_content=self.generate_content_async))
+
+    def generate_content(self, model, contents):
+        self.prompts.append(contents)
+        if self.delay:
+            time.sleep(self.delay)
+        return types.SimpleNamespace(text=self.answer)
+
+    async def generate_content_async(self, model, contents):
+        self.prompts.append(contents)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return types.SimpleNamespace(text=self.answer)
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    import upstream
+    fake = FakeGemini()
+    monkeypatch.setitem(upstream._clients, 'gemini', fake)
+    return fake
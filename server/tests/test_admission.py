@@ -0,0 +1,152 @@
+import asyncio
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from admission import ConcurrencyLimit, MemoryTokenBuckets
+from config import Config
+
+
+@pytest.fixture
+def asgi_module(app_module):
+    import asgi
+    return asgi
+
+
+@pytest.fixture(params=['wsgi', 'asgi'])
+def post_all(request, app_module, asgi_module, monkeypatch):
+    """post_all([(json, headers), ...], path) sends the requests concurrently to the Flask or ASGI app."""
+    # Every request should reach admission control and the upstream client
+    monkeypatch.setattr(app_module, 'ai_cache', None)
+    monkeypatch.setattr(asgi_module, 'ai_cache', None)
+
+    if request.param == 'wsgi':
+        def post_all(requests, path='/api/ai'):
+            def post(item):
+                json, headers = item
+                response = app_module.app.test_client().post(path, json=json, headers=headers)
+                return response.status_code, response.headers, response.get_json(silent=True)
+            with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+                return list(executor.map(post, requests))
+        return post_all
+
+    def post_all(requests, path='/api/ai'):
+        async def run():
+            transport = httpx.ASGITransport(app=asgi_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                responses = await asyncio.gather(*(
+                    client.post(path, json=json, headers=headers) for json, headers in requests
+                ))
+            return [
+                (response.status_code, response.headers,
+                 response.json() if response.headers.get('content-type') == 'application/json' else None)
+                for response in responses
+            ]
+        return asyncio.run(run())
+    return post_all
+
+
+class FakeTextToSpeech:
+    """text_to_speech for both the sync and the async ElevenLabs client."""
+
+    def __init__(self, asynchronous=False):
+        self.asynchronous = asynchronous
+        self.texts = []
+
+    def convert(self, text, **kwargs):
+        self.texts.append(text)
+        if self.asynchronous:
+            async def chunks():
+                yield b'audio'
+            return chunks()
+        return iter([b'audio'])
+
+
+@pytest.fixture
+def elevenlabs(app_module, asgi_module, monkeypatch):
+    import upstream
+    monkeypatch.setattr(Config, 'ELEVEN_LABS_API_KEY', 'test')
+    monkeypatch.setattr(app_module, 'tts_cache', None)
+    monkeypatch.setattr(asgi_module, 'tts_cache', None)
+    sync, asynchronous = FakeTextToSpeech(), FakeTextToSpeech(asynchronous=True)
+    monkeypatch.setitem(upstream._clients, 'elevenlabs', types.SimpleNamespace(text_to_speech=sync))
+    monkeypatch.setitem(upstream._clients, 'async_elevenlabs', types.SimpleNamespace(text_to_speech=asynchronous))
+    return sync, asynchronous
+
+
+def limit_ips(app_module, monkeypatch, burst):
+    # Effectively no refill during the test
+    monkeypatch.setattr(app_module, 'ip_buckets', MemoryTokenBuckets(rate=1 / 3600, burst=burst))
+
+
+def test_identical_prompts_share_one_upstream_call(post_all, gemini):
+    gemini.delay = 0.3
+    results = post_all([({'message': 'How long should a break be?'}, {})] * 5)
+    assert [status for status, _, _ in results] == [200] * 5
+    assert {body['response'] for _, _, body in results} == {gemini.answer}
+    assert len(gemini.prompts) == 1
+
+
+def test_ip_over_its_bucket_gets_429_with_retry_after(post_all, app_module, gemini, monkeypatch):
+    limit_ips(app_module, monkeypatch, burst=2)
+    statuses = []
+    for i in range(3):
+        status, headers, _ = post_all([({'message': f'question {i}'}, {})])[0]
+        statuses.append(status)
+    assert statuses == [200, 200, 429]
+    assert int(headers['Retry-After']) >= 1
+    assert len(gemini.prompts) == 2
+
+
+@pytest.mark.parametrize('trusted', [True, False])
+def test_forwarded_for_is_honoured_only_behind_a_trusted_proxy(post_all, app_module, gemini, monkeypatch, trusted):
+    monkeypatch.setattr(Config, 'TRUST_PROXY_HEADERS', trusted)
+    limit_ips(app_module, monkeypatch, burst=1)
+    statuses = [
+        post_all([({'message': f'question {i}'}, {'X-Forwarded-For': f'203.0.113.{i}, 10.0.0.1'})])[0][0]
+        for i in range(2)
+    ]
+    # Trusted: two clients behind the proxy. Untrusted: both are the proxy's address
+    assert statuses == ([200, 200] if trusted else [200, 429])
+
+
+def test_requests_over_the_concurrency_cap_are_rejected(post_all, app_module, asgi_module, gemini, monkeypatch):
+    slots = ConcurrencyLimit(1)
+    monkeypatch.setattr(app_module, 'upstream_slots', slots)
+    monkeypatch.setattr(asgi_module, 'upstream_slots', slots)
+    gemini.delay = 0.3
+    results = post_all([({'message': 'first question'}, {}), ({'message': 'second question'}, {})])
+    assert sorted(status for status, _, _ in results) == [200, 429]
+    assert all(headers['Retry-After'] for status, headers, _ in results if status == 429)
+    assert (len(gemini.prompts), slots.rejected, slots.in_flight) == (1, 1, 0)
+
+
+def test_tts_counts_against_the_concurrency_cap(post_all, app_module, asgi_module, elevenlabs, monkeypatch):
+    slots = ConcurrencyLimit(1)
+    monkeypatch.setattr(app_module, 'upstream_slots', slots)
+    monkeypatch.setattr(asgi_module, 'upstream_slots', slots)
+
+    slots.acquire()
+    status, headers, _ = post_all([({'message': 'Time for a break.'}, {})], path='/api/tts')[0]
+    assert (status, headers['Retry-After']) == (429, '1')
+    assert elevenlabs[0].texts == elevenlabs[1].texts == []
+
+    slots.release()
+    status, _, _ = post_all([({'message': 'Time for a break.'}, {})], path='/api/tts')[0]
+    assert (status, slots.in_flight) == (200, 0)
+
+
+def test_follower_timeout_is_a_429(app_module, gemini, monkeypatch):
+    monkeypatch.setattr(app_module, 'ai_cache', None)
+    monkeypatch.setattr(Config, 'SINGLE_FLIGHT_TIMEOUT_SECONDS', 0.1)
+    gemini.delay = 0.5
+
+    def ask(_):
+        response = app_module.app.test_client().post('/api/ai', json={'message': 'Same question'})
+        return response.status_code, response.headers.get('Retry-After')
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = sorted(executor.map(ask, range(2)))
+    assert results == [(200, None), (429, '1')]
@@ -0,0 +1,58 @@
+import types
+
+import pytest
+
+import cache
+from cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def ai_cache(app_module, monkeypatch, clock):
+    ai_cache = TTLCache(max_entries=2, ttl=60)
+    monkeypatch.setattr(app_module, 'ai_cache', ai_cache)
+    return ai_cache
+
+
+def ask(client, message):
+    response = client.post('/api/ai', json={'message': message})
+    assert response.status_code == 200
+    return response.get_json()['response']
+
+
+def test_repeat_questions_are_served_from_cache(client, gemini, ai_cache):
+    assert ask(client, "What's the pomodoro technique?") == gemini.answer
+    # Same question after normalization: case, spacing, trailing punctuation
+    assert ask(client, "  what's the POMODORO technique ") == gemini.answer
+    assert len(gemini.prompts) == 1
+    assert ai_cache.stats() == {'backend': 'memory', 'size': 1, 'hits': 1, 'misses': 1}
+    assert client.get('/api/cache-stats').get_json()['data']['ai']['hits'] == 1
+
+
+def test_entries_expire_after_ttl(client, gemini, ai_cache, clock):
+    ask(client, 'What is your name?')
+    clock[0] += 59
+    ask(client, 'What is your name?')
+    assert len(gemini.prompts) == 1
+    clock[0] += 2
+    ask(client, 'What is your name?')
+    assert len(gemini.prompts) == 2
+    assert (ai_cache.hits, ai_cache.misses) == (1, 2)
+
+
+def test_least_recently_used_entry_is_evicted(client, gemini, ai_cache):
+    ask(client, 'first')
+    ask(client, 'second')
+    ask(client, 'first')  # now "second" is the least recently used
+    ask(client, 'third')
+    assert ai_cache.stats()['size'] == 2
+    ask(client, 'first')
+    assert len(gemini.prompts) == 3
+    ask(client, 'second')
+    assert len(gemini.prompts) == 4
@@ -0,0 +1,18 @@
+from models.User import PublicDataCache, User
+
+
+def test_update_in_another_worker_evicts_cached_user(app_module, user, monkeypatch):
+    # Two workers' caches; this one only learns about the rename from Mongo
+    other_worker = PublicDataCache(sync_seconds=60, max_entries=10, ttl=300)
+    other_worker.sync(force=True)
+    other_worker.set(str(user._id), user.public_data())
+
+    user.username = 'renamed'
+    user.update()
+    assert other_worker.get(str(user._id))['username'] == 'tester'
+
+    other_worker.sync(force=True)
+    assert other_worker.get(str(user._id)) is None
+
+    monkeypatch.setattr('models.User.public_data_cache', other_worker)
+    assert User.get_public_data(user._id)['username'] == 'renamed'
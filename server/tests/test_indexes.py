@@ -0,0 +1,173 @@
+"""Index bootstrap, and explain-plan checks for the model queries.
+
+The explain checks need a real mongod: mongomock has no query planner. They
+run against MONGO_TEST_URI (default mongodb://localhost:27017) and skip when
+nothing answers there, unless MONGO_TEST_REQUIRED=1. CI should start a mongod
+service container and set both, so a missing server fails the build instead:
+
+    docker run -d -p 27017:27017 mongo:7
+    MONGO_TEST_URI=mongodb://localhost:27017 MONGO_TEST_REQUIRED=1 python -m pytest tests/test_indexes.py
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pymongo
+import pytest
+from bson import SON
+from pymongo import ASCENDING, monitoring
+from pymongo.errors import PyMongoError
+
+import database
+from config import Config
+
+MONGO_TEST_URI = os.getenv('MONGO_TEST_URI', 'mongodb://localhost:27017')
+MONGO_TEST_REQUIRED = os.getenv('MONGO_TEST_REQUIRED', '').lower() in ('1', 'true', 'yes')
+
+# Commands whose filter can be explained; inserts, index builds and getMores are left out
+EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify'}
+# Fields the driver adds (session, routing, read/write concern) that explain does not accept
+DRIVER_FIELDS = {
+    '$db', 'lsid', '$clusterTime', '$readPreference', 'txnNumber', 'autocommit', 'startTransaction',
+    'readConcern', 'writeConcern'
+}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Keeps the explainable commands the models send while `recording` is on."""
+
+    def __init__(self):
+        self.recording = False
+        self.commands = []
+
+    def started(self, event):
+        if self.recording and event.command_name in EXPLAINABLE:
+            self.commands.append(SON((key, value) for key, value in event.command.items() if key not in DRIVER_FIELDS))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def run(self, fn):
+        """Call fn() and return the commands it sent."""
+        self.commands = []
+        self.recording = True
+        try:
+            fn()
+        finally:
+            self.recording = False
+        return self.commands
+
+
+@pytest.fixture
+def real_mongo(monkeypatch):
+    probe = pymongo.MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=500)
+    try:
+        probe.admin.command('ping')
+    except PyMongoError:
+        if MONGO_TEST_REQUIRED:
+            pytest.fail(f'MONGO_TEST_REQUIRED is set but there is no mongod at {MONGO_TEST_URI}')
+        pytest.skip(f'no mongod at {MONGO_TEST_URI}')
+    finally:
+        probe.close()
+
+    recorder = CommandRecorder()
+    client_options = database._client_options
+
+    def recorded_client_options():
+        options = client_options()
+        options['event_listeners'] = options['event_listeners'] + [recorder]
+        return options
+
+    db_name = f'lockin_explain_{uuid.uuid4().hex[:8]}'
+    monkeypatch.setattr(database, 'MongoClient', pymongo.MongoClient)
+    monkeypatch.setattr(database, '_client_options', recorded_client_options)
+    monkeypatch.setattr(database, '_client', None)
+    monkeypatch.setattr(Config, 'MONGO_URI', MONGO_TEST_URI)
+    monkeypatch.setattr(Config, 'MONGO_DB_NAME', db_name)
+    yield recorder
+    database.get_client().drop_database(db_name)
+    database.get_client().close()
+
+
+def plan_stages(plan):
+    """Every `stage` named anywhere in an explain() document."""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+
+@pytest.mark.parametrize('storage', ['documents', 'buckets'])
+def test_model_queries_use_indexes(real_mongo, monkeypatch, storage):
+    import app
+    from models.DailyActivity import DailyActivity
+    from models.DataVersion import DataVersion
+    from models.Record import Record
+    from models.Session import Session
+    from models.User import User
+
+    monkeypatch.setattr(Config, 'SESSION_STORAGE', storage)
+    app.ensure_indexes()
+    db = database.get_db()
+    user_id = 'explain-user'
+    db.users.insert_many([{'username': f'user{i}', 'email': f'user{i}@example.com'} for i in range(50)])
+    db.records.insert_many([
+        {'user_id': f'user{i}', 'total_sessions': i, 'updated_at': datetime.utcnow() - timedelta(days=i)}
+        for i in range(50)
+    ])
+    sessions = [
+        {'user_id': f'user{i % 5}' if i % 2 else user_id, 'username': 'explain', 'date': f'2025-{i % 3 + 1:02d}-{i % 28 + 1:02d}',
+         'time_started': '10:00', 'total_hours': 1.0, 'intervals': 2}
+        for i in range(200)
+    ]
+    db.sessions.insert_many(sessions)
+    if storage == 'buckets':
+        for owner in {session['user_id'] for session in sessions}:
+            Session.migrate_to_buckets(owner)
+    db.daily_activity.insert_many([
+        {'user_id': user_id if i % 2 else 'user1', 'date': f'2025-01-{i // 2 + 1:02d}', 'sessions': 1}
+        for i in range(60)
+    ])
+    DataVersion.bump(user_id)
+    for i in range(5):
+        app.session_queue.collection.insert_one({
+            '_id': f'entry-{i}', 'payload': {}, 'status': 'pending', 'enqueued_at': datetime.utcnow(),
+            'lease_until': None, 'attempts': 0
+        })
+
+    model_queries = {
+        'User.find_by_email': lambda: User.find_by_email('user7@example.com'),
+        'User.find_by_username': lambda: User.find_by_username('user7'),
+        'Record.find_by_user_id': lambda: Record.find_by_user_id('user7'),
+        'Record.iter_for_ranking(changed_since)': lambda: list(Record.iter_for_ranking(datetime.utcnow() - timedelta(days=3))),
+        'DailyActivity.get_activity': lambda: DailyActivity.get_activity(user_id, '2025-01-31', days=30),
+        'DataVersion.get': lambda: DataVersion.get(user_id),
+        'SessionQueue.claim': lambda: app.session_queue.claim('explain-worker'),
+        'Session.get_date_range_page': lambda: Session.get_date_range_page(user_id, '2025-01-01', '2025-01-31', limit=10),
+        'Session.get_recent_page': lambda: Session.get_recent_page(user_id, 10),
+    }
+    for name, query in model_queries.items():
+        commands = real_mongo.run(query)
+        assert commands, f'{name} sent no query to explain'
+        for command in commands:
+            explain = db.command(SON([('explain', command), ('verbosity', 'queryPlanner')]))
+            stages = set(plan_stages(explain))
+            assert 'COLLSCAN' not in stages, f'{name} falls back to a collection scan: {dict(command)} -> {stages}'
+
+
+def test_ensure_indexes_drops_superseded_session_indexes(app_module):
+    from models.Session import Session, sessions_collection
+    sessions_collection.create_index([('user_id', ASCENDING), ('date', ASCENDING), ('time_started', ASCENDING)], name='user_id_date_time_started')
+    sessions_collection.create_index([('username', ASCENDING)], name='username')
+    Session.ensure_indexes()
+    Session.ensure_indexes()
+    names = set(sessions_collection.index_information())
+    assert 'user_id_date_time_started_id' in names
+    assert not names & {'user_id_date_time_started', 'username'}
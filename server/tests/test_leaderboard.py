@@ -0,0 +1,46 @@
+import threading
+import time
+
+import pytest
+
+from leaderboard import Leaderboard
+from models.Record import Record
+
+
+@pytest.fixture
+def board(app_module, monkeypatch):
+    board = Leaderboard(refresh_seconds=0)
+    monkeypatch.setattr(app_module, 'leaderboard', board)
+    return board
+
+
+def test_answers_503_until_warm(client, user, board, monkeypatch):
+    release = threading.Event()
+    iter_for_ranking = Record.iter_for_ranking
+
+    def slow_scan(changed_since=None):
+        if changed_since is None:
+            release.wait(5)
+        return iter_for_ranking(changed_since)
+
+    monkeypatch.setattr(Record, 'iter_for_ranking', staticmethod(slow_scan))
+    response = client.get('/api/leaderboard?metric=sessions')
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    assert client.get(f'/api/rank/{user._id}').status_code == 503
+
+    release.set()
+    for _ in range(50):
+        if board.ready:
+            break
+        time.sleep(0.1)
+    assert board.ready
+
+    Record.increment_for_user(
+        user_id=str(user._id), username=user.username, hours=2, intervals=1,
+        time_hair=0, time_nail=0, time_eye=0, time_nose=0, time_unfocused=0, time_paused=0
+    )
+    response = client.get('/api/leaderboard?metric=hours')
+    assert response.status_code == 200
+    assert response.get_json()['data']['entries'][0]['score'] == 2
+    assert client.get(f'/api/rank/{user._id}?metric=hours').get_json()['data']['rank']['rank'] == 1
@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import session_payload
+from models.Record import Record
+
+
+def test_concurrent_session_creation_keeps_exact_totals(client, user):
+    workers, per_worker = 8, 25
+
+    def create(n):
+        return [
+            client.post('/api/create-session', json=session_payload(user, time_started=f'{n:02d}:{i:02d}')).status_code
+            for i in range(per_worker)
+        ]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        statuses = [status for batch in executor.map(create, range(workers)) for status in batch]
+
+    total = workers * per_worker
+    assert statuses == [201] * total
+    record = Record.find_by_user_id(str(user._id))
+    assert record.total_sessions == total
+    assert record.total_intervals == 3 * total
+    assert round(record.total_hours, 6) == 1.5 * total
+    assert round(record.time_nail, 6) == round(0.02 * total, 6)
+    assert round(record.time_unfocused, 6) == round(0.1 * total, 6)
+
+
+def test_increment_creates_missing_record(app_module):
+    record = Record.increment_for_user(
+        user_id='64b000000000000000000001', username='newcomer', hours=2, intervals=4,
+        time_hair=0, time_nail=0, time_eye=3600, time_nose=0, time_unfocused=0, time_paused=0
+    )
+    assert (record.total_sessions, record.total_hours, record.time_eye) == (1, 2, 1.0)
+    assert record.username == 'newcomer'
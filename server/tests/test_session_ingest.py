@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from conftest import session_payload
+from config import Config
+from models.DailyActivity import DailyActivity, daily_activity_collection
+from models.Record import Record
+from models.Session import Session
+
+
+@pytest.fixture(params=['documents', 'buckets'])
+def storage(request, monkeypatch, app_module):
+    monkeypatch.setattr(Config, 'SESSION_STORAGE', request.param)
+    # Bucket deduplication relies on the unique (user_id, month) index
+    app_module.ensure_indexes()
+    return request.param
+
+
+def fail_once(monkeypatch, owner, name):
+    """Make owner.name raise on its first call only, like losing Mongo after the writes before it."""
+    original = getattr(owner, name)
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise AutoReconnect(f'{name} failed')
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(owner, name, flaky)
+    return calls
+
+
+def batch(user, count):
+    return {'sessions': [
+        session_payload(user, time_started=f'09:{i:02d}', idempotency_key=f'key-{i}') for i in range(count)
+    ]}
+
+
+def assert_totals(user, count):
+    record = Record.find_by_user_id(str(user._id))
+    assert record.total_sessions == count
+    assert record.total_intervals == 3 * count
+    assert round(record.total_hours, 6) == 1.5 * count
+    day = daily_activity_collection.find_one({'user_id': str(user._id), 'date': '2025-03-14'})
+    assert day['sessions'] == count
+    assert round(day['total_hours'], 6) == 1.5 * count
+
+
+@pytest.mark.parametrize('failing', ['DailyActivity.add_sessions', 'Record.increment_for_sessions', 'Session.mark_applied'])
+def test_retry_after_partial_failure_applies_totals_once(client, user, storage, monkeypatch, failing):
+    owner, name = failing.split('.')
+    fail_once(monkeypatch, {'DailyActivity': DailyActivity, 'Record': Record, 'Session': Session}[owner], name)
+
+    assert client.post('/api/create-sessions', json=batch(user, 3)).status_code == 500
+    response = client.post('/api/create-sessions', json=batch(user, 3))
+    assert response.status_code == 201
+    assert all(result.get('duplicate') for result in response.get_json()['data']['results'])
+    assert_totals(user, 3)
+
+    # Nothing is left to apply, so a third attempt changes nothing
+    assert client.post('/api/create-sessions', json=batch(user, 3)).status_code == 201
+    assert_totals(user, 3)
+
+
+def test_retry_with_new_sessions_mixed_in(client, user, storage, monkeypatch):
+    fail_once(monkeypatch, Record, 'increment_for_sessions')
+    assert client.post('/api/create-sessions', json=batch(user, 2)).status_code == 500
+    assert client.post('/api/create-sessions', json=batch(user, 5)).status_code == 201
+    assert_totals(user, 5)
+
+
+def test_queue_batch_killed_midway_is_drained_once(client, user, storage, monkeypatch):
+    import session_queue as queue_module
+    queue = queue_module.SessionQueue('session_queue_test', batch_size=10, lease_seconds=60)
+    monkeypatch.setattr(queue, 'ensure_started', lambda: None)
+    for i in range(4):
+        queue.enqueue(session_payload(user, time_started=f'10:{i:02d}'))
+
+    # The first worker stores the sessions and the daily rollups, then dies
+    fail_once(monkeypatch, Record, 'increment_for_sessions')
+    with pytest.raises(AutoReconnect):
+        queue.drain_once('worker-a')
+    assert queue.drain_once('worker-b') == 0
+
+    # Its lease runs out and another worker claims the batch again
+    queue.collection.update_many({}, {'$set': {'lease_until': datetime.utcnow() - timedelta(seconds=1)}})
+    assert queue.drain_once('worker-b') == 4
+    assert (queue.processed, queue.duplicates) == (0, 4)
+    assert queue.collection.count_documents({}) == 0
+    assert_totals(user, 4)
+
+
+def test_update_adjusts_bucket_totals(client, user, storage):
+    from models.SessionBucket import session_buckets_collection
+    response = client.post('/api/create-sessions', json=batch(user, 2))
+    session_id = response.get_json()['data']['results'][0]['session_id']
+
+    session = Session.find_by_id(session_id)
+    session.total_hours = 4
+    session.intervals = 5
+    session.update()
+    assert (Session.find_by_id(session_id).total_hours, Session.find_by_id(session_id).intervals) == (4, 5)
+    if storage == 'buckets':
+        bucket = session_buckets_collection.find_one({'sessions._id': session._id})
+        assert (bucket['count'], bucket['totals']['total_hours'], bucket['totals']['intervals']) == (2, 5.5, 8)
+
+    # Moving the session to another month moves it to that month's bucket
+    session.date = '2025-04-02'
+    session.update()
+    assert Session.find_by_id(session_id).date == '2025-04-02'
+    if storage == 'buckets':
+        march, april = session_buckets_collection.find().sort('month', 1)
+        assert (march['count'], march['totals']['total_hours']) == (1, 1.5)
+        assert (april['count'], april['totals']['total_hours'], april['sessions'][0]['_id']) == (1, 4, session._id)
+
+
+@pytest.mark.parametrize('bad', [
+    {'time_hair': 'abc'}, {'total_hours': None}, {'intervals': True}, {'date': '14/03/2025'}, {'time_started': 930}
+])
+def test_invalid_items_are_rejected_before_anything_is_written(client, user, storage, bad):
+    items = batch(user, 2)['sessions']
+    items[1].update(bad)
+    response = client.post('/api/create-sessions', json={'sessions': items + [None]})
+    assert response.status_code == 207
+    results = response.get_json()['data']['results']
+    assert [result['success'] for result in results] == [True, False, False]
+    assert results[1]['message'].startswith(next(iter(bad)))
+    assert results[2]['message'] == "Session must be an object"
+    assert_totals(user, 1)
+    assert len(Session.find_by_user_id(str(user._id))) == 1
+
+
+@pytest.fixture
+def queue(storage, monkeypatch):
+    import session_queue as queue_module
+    queue = queue_module.SessionQueue('session_queue_test', batch_size=10, lease_seconds=60, max_attempts=2)
+    monkeypatch.setattr(queue, 'ensure_started', lambda: None)
+    return queue
+
+
+def expire_leases(queue):
+    queue.collection.update_many({}, {'$set': {'lease_until': datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def test_queue_mode_rejects_invalid_sessions_before_enqueueing(client, user, app_module, monkeypatch):
+    monkeypatch.setattr(Config, 'SESSION_INGEST_MODE', 'queue')
+    monkeypatch.setattr(app_module.session_queue, 'ensure_started', lambda: None)
+    response = client.post('/api/create-session', json=session_payload(user, time_hair='36'))
+    assert response.status_code == 400
+    assert response.get_json()['message'] == "time_hair must be a number"
+    assert app_module.session_queue.collection.count_documents({}) == 0
+
+
+def test_queue_dead_letters_invalid_entries_and_writes_the_rest(user, queue):
+    for i in range(3):
+        queue.enqueue(session_payload(user, time_started=f'10:{i:02d}'))
+    # Staged before validation existed, or by another writer
+    queue.enqueue(session_payload(user, time_started='10:59', time_hair='36'))
+
+    assert queue.drain_once('worker-a') == 4
+    assert_totals(user, 3)
+    dead = list(queue.collection.find())
+    assert [(entry['status'], entry['error']) for entry in dead] == [('failed', "time_hair must be a number")]
+    assert len(Session.find_by_user_id(str(user._id))) == 3
+
+
+def test_queue_isolates_a_session_that_cannot_be_folded(user, queue, monkeypatch):
+    increment_for_sessions = Record.increment_for_sessions
+
+    def reject_one(sessions, retry=False):
+        if any(session['time_started'] == '10:01' for session in sessions):
+            raise ValueError('cannot count this one')
+        return increment_for_sessions(sessions, retry=retry)
+
+    monkeypatch.setattr(Record, 'increment_for_sessions', reject_one)
+    for i in range(4):
+        queue.enqueue(session_payload(user, time_started=f'10:{i:02d}'))
+
+    assert queue.drain_once('worker-a') == 4
+    record = Record.find_by_user_id(str(user._id))
+    assert record.total_sessions == 3
+    [dead] = queue.collection.find()
+    assert (dead['status'], dead['payload']['time_started']) == ('failed', '10:01')
+    assert dead['error'].startswith('Stored but not fully counted')
+
+
+def test_queue_gives_up_after_max_attempts(user, queue, monkeypatch):
+    def lost(*args, **kwargs):
+        raise AutoReconnect('connection lost')
+
+    monkeypatch.setattr(Record, 'increment_for_sessions', lost)
+    queue.enqueue(session_payload(user))
+    for _ in range(queue.max_attempts):
+        with pytest.raises(AutoReconnect):
+            queue.drain_once('worker-a')
+        expire_leases(queue)
+
+    assert queue.drain_once('worker-a') == 0
+    [dead] = queue.collection.find()
+    assert (dead['status'], dead['attempts'], dead['error']) == ('failed', 2, "Gave up after 2 attempts")
@@ -0,0 +1,59 @@
+import pytest
+
+from config import Config
+from conftest import session_payload
+from models.Session import Session
+from models.SessionBucket import SessionBucket
+
+
+@pytest.fixture
+def history(client, user, app_module, monkeypatch):
+    """40 sessions over ten months, stored in both layouts."""
+    monkeypatch.setattr(Config, 'SESSION_STORAGE', 'documents')
+    items = [
+        session_payload(user, date=f'2024-{month:02d}-{day:02d}', time_started=f'09:{day:02d}')
+        for month in range(1, 11) for day in (3, 9, 17, 25)
+    ]
+    assert client.post('/api/create-sessions', json={'sessions': items}).status_code == 201
+    Session.migrate_to_buckets(str(user._id))
+    SessionBucket.ensure_indexes()
+    return str(user._id)
+
+
+def all_pages(fetch, limit):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = fetch(limit, cursor)
+        pages.append([(row['date'], row['time_started']) for row in rows])
+        if not cursor:
+            return pages
+
+
+@pytest.mark.parametrize('limit', [1, 3, 10, 50])
+def test_bucket_pages_match_documents(history, monkeypatch, limit):
+    pages = {}
+    for mode in ('documents', 'buckets'):
+        monkeypatch.setattr(Config, 'SESSION_STORAGE', mode)
+        pages[mode] = (
+            all_pages(lambda n, cursor: Session.get_recent_page(history, n, cursor=cursor), limit),
+            all_pages(lambda n, cursor: Session.get_date_range_page(history, '2024-02-10', '2024-08-31', limit=n, cursor=cursor), limit),
+            [(s.date, s.time_started) for s in Session.get_recent_sessions(history, limit)]
+        )
+    assert pages['documents'] == pages['buckets']
+    assert pages['buckets'][0][0][:3] == [('2024-10-25', '09:25'), ('2024-10-17', '09:17'), ('2024-10-09', '09:09')][:min(limit, 3)]
+
+
+def test_first_recent_page_only_reads_the_newest_months(history, monkeypatch):
+    monkeypatch.setattr(Config, 'SESSION_STORAGE', 'buckets')
+    unwound = []
+    unwind_stages = SessionBucket.unwind_stages
+
+    def spy(query, session_query=None):
+        unwound.append(query)
+        return unwind_stages(query, session_query)
+
+    monkeypatch.setattr(SessionBucket, 'unwind_stages', staticmethod(spy))
+    rows, cursor = Session.get_recent_page(history, 10)
+    assert len(rows) == 10 and cursor
+    # 11 rows (a page plus one) come from the three newest months
+    assert unwound == [{'user_id': history, 'month': {'$gte': SessionBucket.month_of('2024-08-01')}}]
@@ -0,0 +1,23 @@
+"""`import app` regression checks, using benchmarks/startup_bench.py (python -X importtime)."""
+import importlib.util
+import os
+import statistics
+
+from conftest import SERVER_DIR
+
+# Generous next to a typical ~300 ms so slower CI machines pass; tighten with STARTUP_BUDGET_MS
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 1000))
+
+spec = importlib.util.spec_from_file_location('startup_bench', os.path.join(SERVER_DIR, 'benchmarks', 'startup_bench.py'))
+startup_bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(startup_bench)
+
+
+def test_import_app_stays_lazy_and_within_budget():
+    runs = [startup_bench.import_once('app') for _ in range(3)]
+
+    # The upstream SDKs must only be imported by the first request that needs them
+    assert startup_bench.eager_modules(runs[-1]) == []
+
+    median_ms = statistics.median(timings['app'] / 1000 for timings in runs)
+    assert median_ms < STARTUP_BUDGET_MS, f'import app took {median_ms:.0f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)'
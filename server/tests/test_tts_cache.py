@@ -0,0 +1,37 @@
+import os
+
+from cache import DiskCache
+
+
+def set_mtime(cache, key, mtime):
+    os.utime(cache.path_for(key), (mtime, mtime))
+
+
+def test_workers_sharing_a_directory_stay_within_budget(tmp_path):
+    # Two workers: each only ever sees its own puts, yet the directory stays bounded
+    first = DiskCache(str(tmp_path), max_bytes=3000, suffix='.mp3')
+    second = DiskCache(str(tmp_path), max_bytes=3000, suffix='.mp3')
+    for i in range(3):
+        first.put(f'first-{i}', b'x' * 1000)
+        set_mtime(first, f'first-{i}', 1000 + i)
+    for i in range(3):
+        second.put(f'second-{i}', b'x' * 1000)
+        set_mtime(second, f'second-{i}', 2000 + i)
+
+    names = sorted(os.listdir(tmp_path))
+    assert names == ['second-0.mp3', 'second-1.mp3', 'second-2.mp3']
+    assert second.stats()['bytes'] == 3000
+    assert first.get_path('first-0') is None
+
+
+def test_reads_refresh_recency(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=2000, suffix='.mp3')
+    cache.put('a', b'x' * 1000)
+    set_mtime(cache, 'a', 1000)
+    cache.put('b', b'x' * 1000)
+    set_mtime(cache, 'b', 1001)
+    assert cache.get_path('a')  # touches "a", so "b" is now the oldest
+    cache.put('c', b'x' * 1000)
+    assert cache.get_path('b') is None
+    assert cache.get_path('a') and cache.get_path('c')
+    assert (cache.hits, cache.misses) == (3, 1)
@@ -0,0 +1,49 @@
+"""
+Lazily built clients for the external APIs (Gemini, ElevenLabs).
+
+The SDKs are heavy to import, so nothing is imported or constructed until
+the first /api/ai or /api/tts request needs it.
+"""
+import threading
+from config import Config
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def get_gemini_client():
+    def create():
+        from google import genai
+        return genai.Client(api_key=Config.GEMINI_API_KEY)
+    return _get_or_create('gemini', create)
+
+
+def get_elevenlabs_client():
+    """The ElevenLabs client, or None when ELEVEN_LABS isn't configured."""
+    if not Config.ELEVEN_LABS_API_KEY:
+        return None
+
+    def create():
+        from elevenlabs.client import ElevenLabs
+        return ElevenLabs(api_key=Config.ELEVEN_LABS_API_KEY)
+    return _get_or_create('elevenlabs', create)
+
+
+def get_async_elevenlabs_client():
+    if not Config.ELEVEN_LABS_API_KEY:
+        return None
+
+    def create():
+        from elevenlabs.client import AsyncElevenLabs
+        return AsyncElevenLabs(api_key=Config.ELEVEN_LABS_API_KEY)
+    return _get_or_create('async_elevenlabs', create)